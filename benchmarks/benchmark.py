@@ -0,0 +1,231 @@
+#!/usr/bin/env python3
+
+import argparse
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+# Local imports
+from shihtzu import AVAILABLE_QUERIES
+
+
+SHIHTZU = os.path.join(ROOT, 'shihtzu.py')
+
+HELP_EPILOG = '''\
+Examples:
+  > Benchmark every query against a generated collection:
+    generate.py -u 100000 /tmp/collection && benchmark.py /tmp/collection
+  > Benchmark membership queries only, keeping the results for later comparison:
+    benchmark.py -q lgm,lum,lcm -o results.json /tmp/collection
+'''
+
+# Search terms given to each query. `{user}`, `{computer}` and `{group}` are replaced by the names
+# of objects sampled from the collection. Queries not listed here are benchmarked without terms,
+# unless their name has no dash (i.e. `serve`), in which case they are skipped.
+QUERY_TERMS = {
+    'describe-users': ['{user}'],
+    'describe-computers': ['{computer}'],
+    'describe-groups': ['{group}'],
+    'list-group-members': ['domain admins'],
+    'list-user-memberships': ['{user}'],
+    'list-computer-memberships': ['{computer}'],
+    'list-user-sessions': ['{user}'],
+    'list-admin-to': ['{user}'],
+    'list-rdp-to': ['{user}'],
+    'list-outbound-control': ['{user}'],
+    'list-inbound-control': ['{user}'],
+    'find-paths': ['{user}']
+}
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        prog='benchmark.py',
+        description='Time shihtzu queries against a Bloodhound collection.',
+        formatter_class=argparse.RawTextHelpFormatter,
+        epilog=HELP_EPILOG
+    )
+
+    parser.add_argument(
+        '-q', '--queries',
+        help='Only benchmark specific queries (example: lu,lgm).'
+    )
+
+    parser.add_argument(
+        '-r', '--repeat',
+        type=int,
+        default=1,
+        help='Run each benchmark several times, keeping the fastest run (default: 1).'
+    )
+
+    parser.add_argument(
+        '-t', '--terms',
+        type=int,
+        default=10000,
+        help='Number of search terms for the `-f` benchmarks (default: 10000).'
+    )
+
+    parser.add_argument(
+        '-c', '--cache',
+        action='store_true',
+        help="Let shihtzu use its cache (warmed up before timing)."
+    )
+
+    parser.add_argument(
+        '--jobs',
+        metavar='N',
+        type=int,
+        default=1,
+        help="Value for shihtzu's `--jobs` (default: 1)."
+    )
+
+    parser.add_argument(
+        '-o', '--output',
+        help='Also write the results to a JSON file.'
+    )
+
+    parser.add_argument(
+        'collection',
+        nargs='?',
+        default='.',
+        help='Folder holding the Bloodhound files (default: current directory).'
+    )
+
+    args = parser.parse_args()
+
+    if args.repeat < 1:
+        parser.error(f'Invalid value for `-r`: {args.repeat}')
+
+    return args
+
+
+def shihtzu_command(args, shihtzu_args: list[str]) -> list[str]:
+    cmd = [sys.executable, SHIHTZU, f'--jobs={args.jobs}']
+
+    if not args.cache:
+        cmd.append('--no-cache')
+
+    return cmd + shihtzu_args
+
+
+# Runs shihtzu in the collection folder, reading its stdin from `stdin_path` (if set), and returns
+# its wall time in seconds and its peak RSS in MB.
+def run(args, shihtzu_args: list[str], stdin_path=None) -> tuple[float, float]:
+    with open(stdin_path or os.devnull, 'rb') as stdin:
+        start = time.perf_counter()
+
+        process = subprocess.Popen(
+            shihtzu_command(args, shihtzu_args), cwd=args.collection, stdin=stdin,
+            stdout=subprocess.DEVNULL
+        )
+
+        _, status, usage = os.wait4(process.pid, 0)
+        elapsed = time.perf_counter() - start
+
+    process.returncode = os.waitstatus_to_exitcode(status)
+
+    if process.returncode:
+        raise RuntimeError(f"shihtzu failed: {' '.join(shihtzu_args)}")
+
+    # `ru_maxrss` is in bytes on macOS and in kilobytes elsewhere
+    rss = usage.ru_maxrss / (1024 * 1024 if sys.platform == 'darwin' else 1024)
+
+    return elapsed, rss
+
+
+def sample_names(args, query: str) -> list[str]:
+    output = subprocess.run(
+        shihtzu_command(args, [query]), cwd=args.collection, capture_output=True, check=True
+    ).stdout
+
+    return output.decode().split()
+
+
+# The `terms_path` variable holds the path of the file in which to write terms for `-f`
+def build_benchmarks(args, terms_path: str) -> list[tuple]:
+    users = sample_names(args, 'list-users')
+    computers = sample_names(args, 'list-computers')
+    groups = sample_names(args, 'list-groups')
+
+    rng = random.Random(0)
+    names = {
+        'user': rng.choice(users), 'computer': rng.choice(computers), 'group': rng.choice(groups)
+    }
+
+    # Half of the terms of the `-f` benchmarks match users, the other half doesn't
+    hits = rng.sample(users, min(len(users), args.terms // 2))
+    terms = hits + [f'shihtzu-no-match-{i}' for i in range(args.terms - len(hits))]
+
+    with open(terms_path, 'wt') as fo:
+        fo.write('\n'.join(terms) + '\n')
+
+    benchmarks = []
+
+    for query in AVAILABLE_QUERIES:
+        if '-' not in query:
+            continue
+
+        query_terms = [t.format(**names) for t in QUERY_TERMS.get(query, [])]
+        benchmarks.append((query, [query] + query_terms, None))
+
+    benchmarks += [
+        ('list-group-members', ['-r', 'list-group-members', 'domain admins'], None),
+        ('list-user-memberships', ['-r', 'list-user-memberships', names['user']], None),
+        ('list-users', ['-j', 'list-users'], None),
+        ('summary', ['summary'], None),
+        ('list-group-members', ['-j', 'list-group-members', 'domain users'], None),
+        ('list-users', ['-f', '-', 'list-users'], terms_path),
+        ('list-user-memberships', ['-f', '-', 'list-user-memberships'], terms_path)
+    ]
+
+    if args.queries:
+        selected = [q.strip() for q in args.queries.split(',')]
+        aliases = dict(zip(AVAILABLE_QUERIES[1::2], AVAILABLE_QUERIES[::2]))
+        selected = {aliases.get(q, q) for q in selected}
+
+        benchmarks = [b for b in benchmarks if b[0] in selected]
+
+    return benchmarks
+
+
+def main():
+    args = parse_args()
+
+    if args.cache:
+        run(args, ['list-users'])
+
+    results = []
+
+    with tempfile.TemporaryDirectory() as tmp:
+        benchmarks = build_benchmarks(args, os.path.join(tmp, 'terms.txt'))
+
+        print(f"{'Benchmark':<60} {'Wall (s)':>10} {'Peak RSS (MB)':>14}")
+
+        for query, shihtzu_args, stdin_path in benchmarks:
+            runs = [run(args, shihtzu_args, stdin_path=stdin_path) for _ in range(args.repeat)]
+            elapsed = min(r[0] for r in runs)
+            rss = max(r[1] for r in runs)
+
+            label = ' '.join(shihtzu_args)
+
+            if stdin_path:
+                label += f' ({args.terms} terms)'
+
+            print(f'{label:<60} {elapsed:>10.3f} {rss:>14.1f}', flush=True)
+
+            results.append({'query': query, 'args': shihtzu_args, 'wall': elapsed, 'rss': rss})
+
+    if args.output:
+        with open(args.output, 'wt') as fo:
+            json.dump({'jobs': args.jobs, 'cache': args.cache, 'results': results}, fo, indent=2)
+
+
+if __name__ == '__main__':
+    main()
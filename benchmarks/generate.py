@@ -0,0 +1,345 @@
+#!/usr/bin/env python3
+
+import argparse
+import json
+import os
+import random
+
+
+HELP_EPILOG = '''\
+Examples:
+  > Generate a collection with 100k users, 25k computers and 5k groups:
+    generate.py -u 100000 /tmp/collection
+  > Generate a collection with 1M users split into 8 files per type, with 50 ACEs per object:
+    generate.py -u 1000000 -s 8 -a 50 /tmp/collection
+'''
+
+RIGHT_NAMES = (
+    'GenericAll', 'GenericWrite', 'WriteOwner', 'WriteDacl', 'Owns', 'AllExtendedRights',
+    'ForceChangePassword', 'AddMember', 'AddKeyCredentialLink', 'AddSelf'
+)
+
+OPERATING_SYSTEMS = (
+    'Windows 10 Enterprise', 'Windows 11 Enterprise', 'Windows Server 2016 Standard',
+    'Windows Server 2019 Standard', 'Windows Server 2022 Datacenter'
+)
+
+# Well-known groups, created before the generated ones. The first one is also the root of the
+# generated group nesting.
+WELL_KNOWN_GROUPS = (
+    ('DOMAIN ADMINS', 512), ('DOMAIN USERS', 513), ('DOMAIN COMPUTERS', 515),
+    ('ENTERPRISE ADMINS', 519)
+)
+
+# Timestamps are spread over the last few years before this date
+NOW = 1790000000
+YEAR = 365 * 24 * 3600
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        prog='generate.py',
+        description='Generate a synthetic Bloodhound collection for benchmarking shihtzu.',
+        formatter_class=argparse.RawTextHelpFormatter,
+        epilog=HELP_EPILOG
+    )
+
+    parser.add_argument(
+        '-u', '--users',
+        type=int,
+        default=10000,
+        help='Number of users (default: 10000).'
+    )
+
+    parser.add_argument(
+        '-c', '--computers',
+        type=int,
+        help='Number of computers (default: a fourth of the users).'
+    )
+
+    parser.add_argument(
+        '-g', '--groups',
+        type=int,
+        help='Number of groups (default: a twentieth of the users).'
+    )
+
+    parser.add_argument(
+        '-m', '--members',
+        type=int,
+        default=25,
+        help='Number of direct user members per group (default: 25).'
+    )
+
+    parser.add_argument(
+        '-d', '--nesting-depth',
+        type=int,
+        default=5,
+        help='Depth of the group nesting below "Domain Admins" (default: 5).'
+    )
+
+    parser.add_argument(
+        '-a', '--aces',
+        type=int,
+        default=20,
+        help='Number of ACEs per object (default: 20).'
+    )
+
+    parser.add_argument(
+        '-s', '--split',
+        type=int,
+        default=1,
+        help='Number of files per object type, at most 99 (default: 1).'
+    )
+
+    parser.add_argument(
+        '--domain',
+        default='CORP.LOCAL',
+        help='Domain name (default: CORP.LOCAL).'
+    )
+
+    parser.add_argument(
+        '--seed',
+        type=int,
+        default=0,
+        help='Seed of the random generator (default: 0).'
+    )
+
+    parser.add_argument(
+        'output',
+        help='Folder in which to write the collection.'
+    )
+
+    args = parser.parse_args()
+
+    if args.computers is None:
+        args.computers = max(1, args.users // 4)
+
+    if args.groups is None:
+        args.groups = max(1, args.users // 20)
+
+    if args.users < 1 or args.computers < 1 or args.groups < 0:
+        parser.error('There must be at least one user and one computer')
+
+    if not 1 <= args.split <= 99:
+        parser.error(f'Invalid value for `-s`: {args.split}')
+
+    return args
+
+
+class CollectionGenerator:
+    def __init__(self, args):
+        self.args = args
+        self.random = random.Random(args.seed)
+        self.domain = args.domain.upper()
+        self.domain_sid = 'S-1-5-21-{}-{}-{}'.format(
+            *(self.random.randrange(10 ** 9, 4 * 10 ** 9) for _ in range(3))
+        )
+        self.dn_suffix = ','.join(f'DC={dc}' for dc in self.domain.split('.'))
+
+        self.user_sids = [f'{self.domain_sid}-{1000 + i}' for i in range(args.users)]
+        self.computer_sids = [
+            f'{self.domain_sid}-{1000 + args.users + i}' for i in range(args.computers)
+        ]
+        self.group_sids = [f'{self.domain_sid}-{rid}' for _, rid in WELL_KNOWN_GROUPS] + [
+            f'{self.domain_sid}-{1000 + args.users + args.computers + i}'
+            for i in range(args.groups)
+        ]
+
+    def timestamp(self, max_age=5 * YEAR) -> int:
+        return NOW - self.random.randrange(max_age)
+
+    def aces(self) -> list[dict]:
+        principals = self.user_sids + self.group_sids
+
+        return [
+            {
+                'PrincipalSID': self.random.choice(principals),
+                'PrincipalType': 'User',
+                'RightName': self.random.choice(RIGHT_NAMES),
+                'IsInherited': self.random.random() < 0.8
+            }
+            for _ in range(self.args.aces)
+        ]
+
+    def results(self, sids: list[str], count: int, key='ObjectIdentifier') -> dict:
+        return {
+            'Results': [
+                {key: sid, 'ObjectType': 'User'} for sid in self.random.sample(sids, count)
+            ],
+            'Collected': True,
+            'FailureReason': None
+        }
+
+    def user(self, i: int) -> dict:
+        name = f'user{i}'
+        has_spn = self.random.random() < 0.02
+
+        return {
+            'Properties': {
+                'domain': self.domain,
+                'name': f'{name.upper()}@{self.domain}',
+                'distinguishedname': f'CN={name.upper()},OU=Users,{self.dn_suffix}',
+                'domainsid': self.domain_sid,
+                'samaccountname': name,
+                'description': f'Generated user {i}' if self.random.random() < 0.3 else None,
+                'whencreated': self.timestamp(),
+                'enabled': self.random.random() < 0.9,
+                'lastlogon': self.timestamp(2 * YEAR) if self.random.random() < 0.8 else 0,
+                'lastlogontimestamp': -1,
+                'pwdlastset': self.timestamp(3 * YEAR),
+                'pwdneverexpires': self.random.random() < 0.1,
+                'dontreqpreauth': self.random.random() < 0.01,
+                'hasspn': has_spn,
+                'serviceprincipalnames': [f'HTTP/web{i}.{self.domain.lower()}'] if has_spn else [],
+                'displayname': f'User {i}',
+                'email': f'{name}@{self.domain.lower()}',
+                'unixpassword': None,
+                'admincount': False,
+                'sidhistory': []
+            },
+            'AllowedToDelegate': [],
+            'PrimaryGroupSID': f'{self.domain_sid}-513',
+            'HasSIDHistory': [],
+            'SPNTargets': [],
+            'Aces': self.aces(),
+            'ObjectIdentifier': self.user_sids[i],
+            'IsDeleted': False,
+            'IsACLProtected': False
+        }
+
+    def computer(self, i: int) -> dict:
+        name = f'WS{i:06d}'
+        sessions = min(len(self.user_sids), self.random.randrange(4))
+
+        return {
+            'Properties': {
+                'domain': self.domain,
+                'name': f'{name}.{self.domain}',
+                'distinguishedname': f'CN={name},OU=Computers,{self.dn_suffix}',
+                'domainsid': self.domain_sid,
+                'samaccountname': f'{name}$',
+                'haslaps': self.random.random() < 0.6,
+                'description': None,
+                'whencreated': self.timestamp(),
+                'enabled': self.random.random() < 0.95,
+                'unconstraineddelegation': False,
+                'lastlogon': self.timestamp(YEAR),
+                'lastlogontimestamp': -1,
+                'pwdlastset': self.timestamp(YEAR),
+                'serviceprincipalnames': [f'HOST/{name}.{self.domain.lower()}'],
+                'operatingsystem': self.random.choice(OPERATING_SYSTEMS)
+            },
+            'LocalAdmins': self.results(self.user_sids, min(len(self.user_sids), 2)),
+            'RemoteDesktopUsers': self.results(self.user_sids, min(len(self.user_sids), 1)),
+            'DcomUsers': self.results(self.user_sids, 0),
+            'PSRemoteUsers': self.results(self.user_sids, 0),
+            'Sessions': self.results(self.user_sids, sessions, key='UserSID'),
+            'PrivilegedSessions': self.results(self.user_sids, 0, key='UserSID'),
+            'RegistrySessions': self.results(self.user_sids, 0, key='UserSID'),
+            'AllowedToDelegate': [],
+            'AllowedToAct': [],
+            'PrimaryGroupSID': f'{self.domain_sid}-515',
+            'Aces': self.aces(),
+            'ObjectIdentifier': self.computer_sids[i],
+            'IsDeleted': False,
+            'IsACLProtected': False
+        }
+
+    # Generated groups form a tree below "Domain Admins": each group is a member of a group of the
+    # previous nesting level.
+    def group(self, i: int) -> dict:
+        well_known = len(WELL_KNOWN_GROUPS)
+        sid = self.group_sids[i]
+
+        if i < well_known:
+            name = WELL_KNOWN_GROUPS[i][0]
+        else:
+            name = f'GROUP{i - well_known}'
+
+        if name == 'DOMAIN USERS':
+            members = [(s, 'User') for s in self.user_sids]
+        elif name == 'DOMAIN COMPUTERS':
+            members = [(s, 'Computer') for s in self.computer_sids]
+        else:
+            count = min(len(self.user_sids), self.args.members)
+            members = [(s, 'User') for s in self.random.sample(self.user_sids, count)]
+
+            if self.random.random() < 0.1:
+                members.append((self.random.choice(self.computer_sids), 'Computer'))
+
+        members += [(s, 'Group') for s in self.nested_groups(i)]
+
+        return {
+            'Properties': {
+                'domain': self.domain,
+                'name': f'{name}@{self.domain}',
+                'distinguishedname': f'CN={name},OU=Groups,{self.dn_suffix}',
+                'domainsid': self.domain_sid,
+                'samaccountname': name.title(),
+                'description': None,
+                'whencreated': self.timestamp(),
+                'admincount': i == 0
+            },
+            'Members': [{'ObjectIdentifier': s, 'ObjectType': t} for s, t in members],
+            'Aces': self.aces(),
+            'ObjectIdentifier': sid,
+            'IsDeleted': False,
+            'IsACLProtected': False
+        }
+
+    def nested_groups(self, i: int) -> list[str]:
+        well_known = len(WELL_KNOWN_GROUPS)
+        depth = self.args.nesting_depth
+
+        if not depth or not self.args.groups:
+            return []
+
+        # Generated group `n` sits at nesting level `n % depth + 1` and is a member of generated
+        # group `n - 1` (or "Domain Admins" for level 1).
+        if i == 0:
+            children = range(0, self.args.groups, depth)
+        elif i >= well_known:
+            n = i - well_known
+            children = [n + 1] if n % depth != depth - 1 and n + 1 < self.args.groups else []
+        else:
+            children = []
+
+        return [self.group_sids[well_known + c] for c in children]
+
+    def write(self, kind: str, count: int, build):
+        os.makedirs(self.args.output, exist_ok=True)
+
+        split = min(self.args.split, count) or 1
+        per_file = -(-count // split)
+
+        for f in range(split):
+            suffix = f'_{f + 1:02d}' if split > 1 else ''
+            path = os.path.join(self.args.output, f'shihtzu_{kind}{suffix}.json')
+            indices = range(f * per_file, min(count, (f + 1) * per_file))
+
+            with open(path, 'wt') as fo:
+                fo.write('{"data":[')
+
+                for n, i in enumerate(indices):
+                    if n:
+                        fo.write(',')
+
+                    fo.write(json.dumps(build(i), separators=(',', ':')))
+
+                meta = {'methods': 0, 'type': kind, 'count': len(indices), 'version': 5}
+                fo.write(f'],"meta":{json.dumps(meta)}}}')
+
+    def generate(self):
+        self.write('users', len(self.user_sids), self.user)
+        self.write('computers', len(self.computer_sids), self.computer)
+        self.write('groups', len(self.group_sids), self.group)
+
+
+def main():
+    args = parse_args()
+
+    CollectionGenerator(args).generate()
+
+
+if __name__ == '__main__':
+    main()
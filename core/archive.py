@@ -0,0 +1,66 @@
+#!/usr/bin/env python3
+
+from io import TextIOWrapper
+from typing import NamedTuple
+import os
+import re
+import zipfile
+
+
+# Extension of the archives generated by SharpHound
+ARCHIVE_EXTENSION = '.zip'
+
+
+# Bloodhound file stored in an archive. Members are streamed from the archive as they are parsed,
+# without being extracted. Being tuples of strings, they are picklable (so worker processes can
+# open them on their own) and hashable.
+class ArchiveMember(NamedTuple):
+    archive: str
+    name: str
+
+    def __str__(self):
+        return f'{self.archive}:{self.name}'
+
+    @property
+    def basename(self) -> str:
+        return self.name.rsplit('/', 1)[-1]
+
+    def open(self):
+        # The archive itself is only closed once the member is
+        with zipfile.ZipFile(self.archive) as zf:
+            member = zf.open(self.name)
+
+        return TextIOWrapper(member, encoding='utf-8')
+
+
+def is_archive(path: str) -> bool:
+    return path.lower().endswith(ARCHIVE_EXTENSION) and zipfile.is_zipfile(path)
+
+
+# Lists the members of `archive` whose file name matches `pattern`, in the order of their names
+def find_members(archive: str, pattern: str) -> list[ArchiveMember]:
+    with zipfile.ZipFile(archive) as zf:
+        members = [ArchiveMember(archive, n) for n in zf.namelist() if not n.endswith('/')]
+
+    return sorted(m for m in members if re.match(pattern, m.basename))
+
+
+# Opens a Bloodhound file for reading, be it a regular file or an `ArchiveMember`
+def open_source(path):
+    if isinstance(path, ArchiveMember):
+        return path.open()
+
+    return open(path, 'rt')
+
+
+# Path of the file holding `path` on disk (i.e. the archive of an `ArchiveMember`)
+def source_file(path) -> str:
+    return path.archive if isinstance(path, ArchiveMember) else path
+
+
+# Name identifying `path` within the folder of its `source_file`
+def source_name(path) -> str:
+    if isinstance(path, ArchiveMember):
+        return f"{os.path.basename(path.archive)}.{path.name.replace('/', '_')}"
+
+    return os.path.basename(path)
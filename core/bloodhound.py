@@ -1,18 +1,543 @@
 #!/usr/bin/env python3
 
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime
 from io import DEFAULT_BUFFER_SIZE
+from itertools import repeat
 import json
 import os
 import re
+import sys
+
+# Local imports
+from core.archive import find_members, is_archive, open_source, ARCHIVE_EXTENSION
+from core.cache import load_cached
+from core.stats import Stats, TimedReader
 
 
 RE_BH_FILE_USERS = r'.*_users(_(0[1-9]|[1-9][0-9]))?\.json'
 RE_BH_FILE_COMPUTERS = r'.*_computers(_(0[1-9]|[1-9][0-9]))?\.json'
 RE_BH_FILE_GROUPS = r'.*_groups(_(0[1-9]|[1-9][0-9]))?\.json'
 
+RE_JSON_WHITESPACE = re.compile(r'[ \t\n\r]*')
+
+BH_JSON_DECODER = json.JSONDecoder()
+BH_READ_SIZE = DEFAULT_BUFFER_SIZE * 64
+
+JSON_WHITESPACE = ' \t\n\r'
+
+# Characters that may continue a number, which can't follow a complete value
+JSON_NUMBER_CHARS = '.eE+-0123456789'
+
+# Statistics of the current query (see `set_stats`)
+STATS = None
+
+
+# Hook enabling the collection of loading statistics (`--stats`) by the functions of this module,
+# which are added to `stats` (a `Stats` instance). Use `None` to disable it.
+def set_stats(stats):
+    global STATS
+
+    STATS = stats
+
+
+def get_stats():
+    return STATS
+
+
+# Decodes the JSON object starting at `buf[pos]`, keeping only its top-level keys listed in
+# `fields`. Unwanted arrays holding only flat objects and plain strings (which is the case for
+# `Aces`, `AllowedToDelegate`, `HasSIDHistory` and similar arrays in Bloodhound files) are skipped
+# without being decoded: if the span up to the next `]` holds no `[`, no escapes and an even
+# number of quotes, that `]` must close the array. Other unwanted values are decoded and dropped.
+# Raises `IndexError`, `StopIteration` or `ValueError` if `buf` ends before the object does.
+def project_object(buf: str, pos: int, fields) -> tuple[dict, int]:
+    scan = BH_JSON_DECODER.scan_once
+
+    if buf[pos] != '{':
+        return scan(buf, pos)
+
+    obj = {}
+    pos += 1
+
+    if buf[pos] in JSON_WHITESPACE:
+        pos = RE_JSON_WHITESPACE.match(buf, pos).end()
+
+    if buf[pos] == '}':
+        return obj, pos + 1
+
+    while True:
+        key, pos = scan(buf, pos)
+
+        if buf[pos] in JSON_WHITESPACE:
+            pos = RE_JSON_WHITESPACE.match(buf, pos).end()
+
+        if buf[pos] != ':':
+            raise ValueError(f'Expecting ":" delimiter at position {pos}')
+
+        pos += 1
+
+        if buf[pos] in JSON_WHITESPACE:
+            pos = RE_JSON_WHITESPACE.match(buf, pos).end()
+
+        if key in fields:
+            obj[key], pos = scan(buf, pos)
+        elif buf[pos] == '[':
+            end = buf.index(']', pos)
+
+            if buf.find('[', pos + 1, end) < 0 and buf.find('\\', pos, end) < 0 and \
+               not buf.count('"', pos, end) & 1:
+                pos = end + 1
+            else:
+                pos = scan(buf, pos)[1]
+        else:
+            pos = scan(buf, pos)[1]
+
+        if buf[pos] in JSON_WHITESPACE:
+            pos = RE_JSON_WHITESPACE.match(buf, pos).end()
+
+        if buf[pos] == '}':
+            return obj, pos + 1
+
+        if buf[pos] != ',':
+            raise ValueError(f'Expecting "," delimiter at position {pos}')
+
+        pos += 1
+
+        if buf[pos] in JSON_WHITESPACE:
+            pos = RE_JSON_WHITESPACE.match(buf, pos).end()
+
+
+# Minimal incremental reader over a text file object. Values are decoded with the standard
+# library's `raw_decode` as soon as enough of the file has been buffered, so the buffer only
+# ever needs to hold the value currently being decoded.
+class JSONStream:
+    def __init__(self, fo, read_size=BH_READ_SIZE):
+        self.fo = fo
+        self.read_size = read_size
+        self.buf = ''
+        self.pos = 0
+        self.eof = False
+
+    def fill(self):
+        # Read at least as much as is currently pending so that values larger than `read_size`
+        # are buffered in a logarithmic number of attempts.
+        data = self.fo.read(max(self.read_size, len(self.buf) - self.pos))
+
+        if not data:
+            self.eof = True
+
+        if not self.buf and data.startswith('\ufeff'):
+            data = data[1:]
+
+        self.buf = self.buf[self.pos:] + data
+        self.pos = 0
+
+    def skip_whitespace(self):
+        while True:
+            self.pos = RE_JSON_WHITESPACE.match(self.buf, self.pos).end()
+
+            if self.pos < len(self.buf) or self.eof:
+                return
+
+            self.fill()
+
+    def next_char(self) -> str:
+        self.skip_whitespace()
+
+        if self.pos >= len(self.buf):
+            raise ValueError('Unexpected end of JSON data')
+
+        self.pos += 1
+
+        return self.buf[self.pos - 1]
+
+    def expect(self, chars: str) -> str:
+        c = self.next_char()
+
+        if c not in chars:
+            raise ValueError(f'Unexpected character in JSON data: {c!r} (expected {chars!r})')
+
+        return c
+
+    def peek(self) -> str:
+        self.skip_whitespace()
+
+        return self.buf[self.pos] if self.pos < len(self.buf) else ''
+
+    # Decodes the next value. If `raw` is set, the exact source text of the value is returned along
+    # with it.
+    def decode(self, raw=False):
+        while True:
+            self.skip_whitespace()
+
+            try:
+                value, end = BH_JSON_DECODER.raw_decode(self.buf, self.pos)
+            except json.JSONDecodeError:
+                if self.eof:
+                    raise
+
+                self.fill()
+                continue
+
+            # A scalar that ends exactly at the end of the buffer may be truncated, and so may a
+            # number followed by the rest of its fraction or exponent (i.e. `-2` out of `-2.5`)
+            if not self.eof and (end >= len(self.buf) or self.buf[end] in JSON_NUMBER_CHARS):
+                self.fill()
+                continue
+
+            start, self.pos = self.pos, end
+
+            return (value, self.buf[start:end]) if raw else value
+
+    # Same as `decode`, but only the keys listed in `fields` are decoded (see `project_object`)
+    def decode_object(self, fields, raw=False):
+        while True:
+            self.skip_whitespace()
+
+            try:
+                value, end = project_object(self.buf, self.pos, fields)
+            except (IndexError, StopIteration, ValueError) as e:
+                # The object is either invalid or not entirely buffered yet
+                if self.eof:
+                    raise ValueError('Invalid or truncated object in Bloodhound data') from e
+
+                self.fill()
+                continue
+
+            start, self.pos = self.pos, end
+
+            return (value, self.buf[start:end]) if raw else value
+
+
+# Walks the top-level `data` array of a Bloodhound file and yields its objects one at a time, along
+# with their source text if `raw_json` is set (or `None` otherwise). If `fields` is set, only these
+# keys of each object are decoded. Any other top-level key (i.e. `meta`) is decoded and discarded.
+# If `where` is set (i.e. a `Predicate`), only the objects for which it returns `True` are yielded.
+def iter_bh_data(fo, raw_json=False, fields=None, where=None):
+    stream = JSONStream(fo)
+
+    stream.expect('{')
+
+    if stream.peek() == '}':
+        return
+
+    while True:
+        key = stream.decode()
+        stream.expect(':')
+
+        if key != 'data':
+            stream.decode()
+        else:
+            stream.expect('[')
+
+            if stream.peek() == ']':
+                stream.next_char()
+            else:
+                while True:
+                    if fields is not None:
+                        item = stream.decode_object(fields, raw=True) if raw_json else \
+                               (stream.decode_object(fields), None)
+                    else:
+                        item = stream.decode(raw=True) if raw_json else (stream.decode(), None)
+
+                    if where is None or where(item[0]):
+                        yield item
+
+                    if stream.expect(',]') == ']':
+                        break
+
+        if stream.expect(',}') == '}':
+            return
+
+
+# Object IDs listed in the `Results` of the `keys` of a decoded Bloodhound object (i.e. the users
+# having sessions on a computer), under `id_key`. Missing keys (i.e. when they weren't decoded)
+# yield an empty tuple.
+def result_ids(data: dict, keys, id_key: str) -> tuple:
+    ids = []
+
+    for key in keys:
+        value = data.get(key)
+
+        if isinstance(value, dict):
+            for result in value.get('Results') or ():
+                ids.append(sys.intern(result.get(id_key) or ''))
+
+    return tuple(dict.fromkeys(i for i in ids if i))
+
+
+# Principals granted rights on a decoded Bloodhound object by its ACEs, as (principal object ID,
+# right name) pairs. Both are interned, as the same principals and rights are found on most
+# objects. Objects whose `Aces` weren't decoded yield an empty tuple.
+def ace_edges(data: dict) -> tuple:
+    return tuple(
+        (sys.intern(ace.get('PrincipalSID') or ''), sys.intern(ace.get('RightName') or ''))
+        for ace in data.get('Aces') or ()
+    )
+
+
+# Bloodhound timestamps are kept as integers and only turned into dates when displayed
+def timestamp_date(timestamp: int):
+    return datetime.fromtimestamp(timestamp) if timestamp else ''
+
+
+# Loads the objects of class `cls` from a single Bloodhound file, keeping only those for which
+# `accept` returns `True` (if set). Objects filtered with a `where` option are always parsed from
+# the file, as cached objects no longer hold the properties it may test.
+def load_path(cls, path: str, options: dict, cache=False, accept=None):
+    if cache and options.get('where') is None:
+        objects = load_cached(path, cls, **options)
+
+        if STATS is not None:
+            objects = STATS.timed_iter('cache', objects, exclude=('read', 'decode', 'build'))
+    else:
+        objects = cls.load_file(path, **options)
+
+    if STATS is not None and accept:
+        accept = STATS.timed('match', accept)
+
+    return filter(accept, objects) if accept else objects
+
+
+# Process pool entry point: objects are filtered before being sent back to the parent process,
+# along with the statistics of the worker if `stats` is set.
+def load_path_accepted(cls, path: str, options: dict, cache=False, accept=None,
+                       stats=False) -> tuple[list, Stats]:
+    # Forked workers inherit the statistics of the parent, which must not be counted twice
+    set_stats(Stats() if stats else None)
+
+    return list(load_path(cls, path, options, cache=cache, accept=accept)), STATS
+
+
+# Instrumented equivalent of the loop of `load_file`, used when collecting statistics
+def load_file_stats(cls, fo, search_properties, raw_json, fields, where):
+    stats = STATS
+    stats.counters['files'] += 1
+    match = None
+
+    # Objects rejected by `where` are parsed too, so they are counted as they are tested
+    if where is not None:
+        match = stats.timed('match', where)
+
+        def where(data: dict) -> bool:
+            stats.counters['parsed'] += 1
+
+            return match(data)
+
+    objects = stats.timed_iter(
+        'decode',
+        iter_bh_data(TimedReader(fo, stats), raw_json=raw_json, fields=fields, where=where),
+        exclude=('read', 'match')
+    )
+
+    build = stats.timed('build', cls)
+
+    for data, raw in objects:
+        if match is None:
+            stats.counters['parsed'] += 1
+
+        yield build(data, search_properties=search_properties, raw_json=raw)
+
+
+# Lists the Bloodhound files whose name matches `pattern` in `bh_path`, which is either a folder or
+# a SharpHound archive. The archives of a folder are only searched when it doesn't hold matching
+# files, so that collections which were extracted next to their archive aren't loaded twice.
+# Members of archives are returned as `ArchiveMember`s.
+def find_bh_files(bh_path: str, pattern: str) -> list:
+    if os.path.isfile(bh_path):
+        return find_members(bh_path, pattern) if is_archive(bh_path) else []
+
+    bh_files = []
+    archives = []
+
+    for fn in sorted(os.listdir(bh_path)):
+        if re.match(pattern, fn):
+            bh_files.append(os.path.join(bh_path, fn))
+        elif fn.lower().endswith(ARCHIVE_EXTENSION):
+            archives.append(os.path.join(bh_path, fn))
+
+    if bh_files:
+        return bh_files
+
+    for archive in archives:
+        if is_archive(archive):
+            bh_files.extend(find_members(archive, pattern))
+
+    return bh_files
+
+
+# Lists the Bloodhound files of class `cls` in one or several collections (`bh_path` being a path
+# or a list of paths), timing it when collecting statistics
+def discover_files(cls, bh_path='.') -> list[str]:
+    bh_paths = [bh_path] if isinstance(bh_path, str) else bh_path
+
+    if STATS is None:
+        return [path for p in bh_paths for path in cls.find_files(p)]
+
+    with STATS.phase('discovery'):
+        return [path for p in bh_paths for path in cls.find_files(p)]
+
+
+# Whether `bh_path` lists several collections, whose objects have to be merged
+def several_collections(bh_path) -> bool:
+    return not isinstance(bh_path, str) and len(bh_path) > 1
+
+
+# Objects loaded from several collections are merged, keeping the first of the objects sharing an
+# object ID (i.e. the same domain collected twice, or trusted domains collecting the same objects).
+# The object IDs seen so far are kept, so this is only done when there are several collections.
+def unique_objects(objects):
+    seen = set()
+
+    for ado in objects:
+        if ado.object_id in seen:
+            continue
+
+        seen.add(ado.object_id)
+
+        yield ado
+
+
+# Loads the objects of class `cls` from Bloodhound files, in the order of `paths`. If `jobs` is
+# greater than 1, split files are parsed concurrently by a pool of `jobs` processes. Since objects
+# have to be pickled back to the parent, `accept` (a picklable callable, i.e. `ObjectFilter`)
+# should then be used to filter them in the workers.
+def load_paths(cls, paths: list[str], options: dict, cache=False, jobs=1, accept=None):
+    if jobs <= 1 or len(paths) <= 1:
+        for path in paths:
+            yield from load_path(cls, path, options, cache=cache, accept=accept)
+
+        return
+
+    pool = ProcessPoolExecutor(max_workers=min(jobs, len(paths)))
+
+    try:
+        results = pool.map(
+            load_path_accepted, repeat(cls), paths, repeat(options), repeat(cache), repeat(accept),
+            repeat(STATS is not None)
+        )
+
+        for objects, stats in results:
+            if stats is not None and STATS is not None:
+                STATS.merge(stats)
+
+            yield from objects
+    finally:
+        pool.shutdown(cancel_futures=True)
+
+
+# Default of the `fields` and `search_properties` parameters of `BloodhoundObject` loaders, standing
+# for the `FIELDS` and `DEFAULT_SEARCH_PROPERTIES` of the class being loaded (`None` being a valid
+# value of `fields`)
+CLASS_DEFAULT = object()
+
+
+# Loading of the objects of a Bloodhound file type. Subclasses set `FILE_PATTERN` (matching the
+# names of their files) and `FILE_TYPE` (used in error messages), along with the attributes used
+# by their constructor.
+class BloodhoundObject:
+    __slots__ = ()
+
+    FILE_PATTERN = None
+    FILE_TYPE = None
+
+    FIELDS = []
+    DEFAULT_SEARCH_PROPERTIES = []
+
+    @property
+    def creation_date(self):
+        return timestamp_date(self.creation_timestamp)
+
+    @property
+    def json(self) -> str:
+        if self.raw_json is None:
+            raise RuntimeError('The object was loaded without its Bloodhound JSON.')
+
+        return self.raw_json
+
+    # The `bh_path` variable holds the path to the folder containing the *.json files generated by
+    # Bloodhound, or to a SharpHound archive (see `find_bh_files`). `load_files` also accepts a list
+    # of such paths, whose objects are merged if there are several (see `unique_objects`).
+    @classmethod
+    def find_files(cls, bh_path='.') -> list:
+        bh_files = find_bh_files(bh_path, cls.FILE_PATTERN)
+
+        if not bh_files:
+            raise RuntimeError(f'No BloodHound {cls.FILE_TYPE} files were found.')
+
+        return bh_files
+
+    # The `fields` variable holds the top-level keys to be decoded from each object, which
+    # defaults to `FIELDS` (use `None` to decode objects entirely). The `where` variable holds a
+    # predicate over the decoded objects (see `Predicate`), which is checked before objects are
+    # built. See `load_paths` for the remaining parameters.
+    @classmethod
+    def load_files(cls, bh_path='.', search_properties=CLASS_DEFAULT, cache=False, raw_json=False,
+                   fields=CLASS_DEFAULT, jobs=1, accept=None, where=None):
+        if search_properties is CLASS_DEFAULT:
+            search_properties = cls.DEFAULT_SEARCH_PROPERTIES
+
+        if fields is CLASS_DEFAULT:
+            fields = cls.FIELDS
+
+        options = {'search_properties': search_properties, 'raw_json': raw_json, 'fields': fields}
+
+        if where is not None:
+            options['where'] = where
+
+        objects = load_paths(
+            cls, discover_files(cls, bh_path), options, cache=cache, jobs=jobs, accept=accept
+        )
+
+        yield from unique_objects(objects) if several_collections(bh_path) else objects
+
+    @classmethod
+    def load_file(cls, path: str, search_properties=CLASS_DEFAULT, raw_json=False,
+                  fields=CLASS_DEFAULT, where=None):
+        if search_properties is CLASS_DEFAULT:
+            search_properties = cls.DEFAULT_SEARCH_PROPERTIES
+
+        if fields is CLASS_DEFAULT:
+            fields = cls.FIELDS
+
+        with open_source(path) as fo:
+            if STATS is not None:
+                yield from load_file_stats(cls, fo, search_properties, raw_json, fields, where)
+                return
+
+            for data, raw in iter_bh_data(fo, raw_json=raw_json, fields=fields, where=where):
+                yield cls(data, search_properties=search_properties, raw_json=raw)
+
+    def matches_term(self, search_term: str) -> bool:
+        return True if search_term in self.search_string else False
+
+
+# Users and computers, which both log on and have passwords
+class DomainAccount(BloodhoundObject):
+    __slots__ = ()
+
+    @property
+    def last_logon(self):
+        return timestamp_date(self.last_logon_timestamp)
+
+    @property
+    def pwd_last_set(self):
+        return timestamp_date(self.pwd_last_set_timestamp)
+
+
+class DomainUser(DomainAccount):
+    # Objects are kept in large numbers by membership queries and `serve`
+    __slots__ = (
+        'raw_json', 'object_id', 'enabled', 'domain', 'sam_account_name', 'distinguished_name',
+        'spns', 'pwd_never_expires', 'dont_req_preauth', 'unix_password', 'display_name',
+        'description', 'email', 'creation_timestamp', 'last_logon_timestamp',
+        'pwd_last_set_timestamp', 'search_string', 'aces'
+    )
+
+    FILE_PATTERN = RE_BH_FILE_USERS
+    FILE_TYPE = 'users'
 
-class DomainUser:
     SEARCH_PROPERTIES = [
         'objectid', 'enabled', 'domain', 'samaccountname', 'distinguishedname', 'displayname',
         'description', 'email'
@@ -20,17 +545,26 @@ class DomainUser:
 
     DEFAULT_SEARCH_PROPERTIES = ['objectid', 'samaccountname', 'description', 'displayname']
 
-    def __init__(self, data: dict, search_properties=DEFAULT_SEARCH_PROPERTIES):
+    # Top-level keys of Bloodhound objects used by the class
+    FIELDS = ['ObjectIdentifier', 'Properties']
+
+    # Top-level keys to decode when the ACEs of objects are needed (see `ControlIndex`)
+    ACE_FIELDS = FIELDS + ['Aces']
+
+    # The `raw_json` variable holds the source text of the object, which is kept only when JSON
+    # output is needed.
+    def __init__(self, data: dict, search_properties=DEFAULT_SEARCH_PROPERTIES, raw_json=None):
         properties = data['Properties']
         properties['objectid'] = data.get('ObjectIdentifier', '')
 
-        self.json = json.dumps(data)
+        self.raw_json = raw_json
         self.object_id = properties.get('objectid') or ''
         self.enabled = properties.get('enabled') or False
-        self.domain = properties.get('domain') or ''
+        self.domain = sys.intern(properties.get('domain') or '')
         self.sam_account_name = properties.get('samaccountname') or ''
         self.distinguished_name = properties.get('distinguishedname') or ''
-        self.spns = properties.get('serviceprincipalnames', [])
+        self.spns = tuple(properties.get('serviceprincipalnames') or ())
+        self.aces = ace_edges(data)
         self.pwd_never_expires = properties.get('pwdneverexpires') or False
         self.dont_req_preauth = properties.get('dontreqpreauth') or False
         self.unix_password = properties.get('unixpassword') or ''
@@ -38,16 +572,9 @@ class DomainUser:
         self.description = properties.get('description') or ''
         self.email = properties.get('email') or ''
 
-        self.creation_date = self.last_logon = self.pwd_last_set = ''
-
-        if properties.get('whencreated'):
-            self.creation_date = datetime.fromtimestamp(properties.get('whencreated', 0))
-
-        if properties.get('lastlogon'):
-            self.last_logon = datetime.fromtimestamp(properties.get('lastlogon', 0))
-
-        if properties.get('pwdlastset'):
-            self.pwd_last_set = datetime.fromtimestamp(properties.get('pwdlastset', 0))
+        self.creation_timestamp = properties.get('whencreated') or 0
+        self.last_logon_timestamp = properties.get('lastlogon') or 0
+        self.pwd_last_set_timestamp = properties.get('pwdlastset') or 0
 
         self.search_string = '\n'.join(
             [properties.get(sp) or '' for sp in search_properties]
@@ -71,67 +598,65 @@ class DomainUser:
             f"Service Principal Names : {', '.join(self.spns)}"
         )
 
-    # The `bh_path` variable holds the path to the folder containing the *.json files generated by
-    # Bloodhound.
-    @classmethod
-    def load_files(cls, bh_path='.', search_properties=DEFAULT_SEARCH_PROPERTIES):
-        bh_files = []
 
-        for fn in os.listdir(bh_path):
-            if re.match(RE_BH_FILE_USERS, fn):
-                bh_files.append(fn)
+class DomainComputer(DomainAccount):
+    # Objects are kept in large numbers by membership queries and `serve`
+    __slots__ = (
+        'raw_json', 'object_id', 'enabled', 'domain', 'sam_account_name', 'distinguished_name',
+        'spns', 'has_laps', 'name', 'description', 'operating_system', 'creation_timestamp',
+        'last_logon_timestamp', 'pwd_last_set_timestamp', 'search_string', 'sessions',
+        'local_admins', 'remote_desktop_users', 'aces'
+    )
 
-        if not bh_files:
-            raise RuntimeError('No BloodHound users files were found.')
+    FILE_PATTERN = RE_BH_FILE_COMPUTERS
+    FILE_TYPE = 'computers'
 
-        for path in bh_files:
-            with open(path, 'rt') as fo:
-                users = json.loads(fo.read())
-
-            for u in users['data']:
-                yield cls(u, search_properties=search_properties)
-
-    def matches_term(self, search_term: str) -> bool:
-        return True if search_term in self.search_string else False
-
-
-class DomainComputer:
     SEARCH_PROPERTIES = [
-        'objectid', 'domain', 'samaccountname', 'distinguishedname', 'name'
-        'description', 'operating_system'
+        'objectid', 'domain', 'samaccountname', 'distinguishedname', 'name',
+        'description', 'operatingsystem'
     ]
 
     DEFAULT_SEARCH_PROPERTIES = ['objectid', 'samaccountname', 'description', 'name']
 
-    def __init__(self, data: dict, search_properties=DEFAULT_SEARCH_PROPERTIES):
+    # Top-level keys of Bloodhound objects used by the class
+    FIELDS = ['ObjectIdentifier', 'Properties']
+
+    # Top-level keys listing the principals having access to computers, which are only decoded
+    # when needed (see `AccessIndex`)
+    SESSION_FIELDS = ['Sessions', 'PrivilegedSessions', 'RegistrySessions']
+    ACCESS_FIELDS = FIELDS + SESSION_FIELDS + ['LocalAdmins', 'RemoteDesktopUsers']
+
+    # Top-level keys to decode when the ACEs of objects are needed (see `ControlIndex`)
+    ACE_FIELDS = FIELDS + ['Aces']
+
+    # The `raw_json` variable holds the source text of the object, which is kept only when JSON
+    # output is needed.
+    def __init__(self, data: dict, search_properties=DEFAULT_SEARCH_PROPERTIES, raw_json=None):
         properties = data['Properties']
         properties['objectid'] = data.get('ObjectIdentifier', '')
 
-        self.json = json.dumps(data)
+        self.raw_json = raw_json
         self.object_id = properties.get('objectid') or ''
         self.enabled = properties.get('enabled') or False
-        self.domain = properties.get('domain') or ''
+        self.domain = sys.intern(properties.get('domain') or '')
         self.sam_account_name = properties.get('samaccountname') or ''
         self.distinguished_name = properties.get('distinguishedname') or ''
-        self.spns = properties.get('serviceprincipalnames', [])
+        self.spns = tuple(properties.get('serviceprincipalnames') or ())
+        self.aces = ace_edges(data)
+        self.sessions = result_ids(data, self.SESSION_FIELDS, 'UserSID')
+        self.local_admins = result_ids(data, ('LocalAdmins',), 'ObjectIdentifier')
+        self.remote_desktop_users = result_ids(data, ('RemoteDesktopUsers',), 'ObjectIdentifier')
         self.has_laps = properties.get('haslaps') or False
         self.name = properties.get('name') or ''
         self.description = properties.get('description') or ''
-        self.operating_system = properties.get('operating_system') or ''
-
-        self.creation_date = self.last_logon = self.pwd_last_set = ''
-
-        if properties.get('whencreated'):
-            self.creation_date = datetime.fromtimestamp(properties.get('whencreated', 0))
-
-        if properties.get('lastlogon'):
-            self.last_logon = datetime.fromtimestamp(properties.get('lastlogon', 0))
+        self.operating_system = properties.get('operatingsystem') or ''
 
-        if properties.get('pwdlastset'):
-            self.pwd_last_set = datetime.fromtimestamp(properties.get('pwdlastset', 0))
+        self.creation_timestamp = properties.get('whencreated') or 0
+        self.last_logon_timestamp = properties.get('lastlogon') or 0
+        self.pwd_last_set_timestamp = properties.get('pwdlastset') or 0
 
         self.search_string = '\n'.join(
-            [properties.get(sp, '') for sp in search_properties]
+            [properties.get(sp) or '' for sp in search_properties]
         ).lower()
 
     def __str__(self):
@@ -151,58 +676,50 @@ class DomainComputer:
             f"Service Principal Names : {', '.join(self.spns)}"
         )
 
-    # The `bh_path` variable holds the path to the folder containing the *.json files generated by
-    # Bloodhound.
-    @classmethod
-    def load_files(cls, bh_path='.', search_properties=DEFAULT_SEARCH_PROPERTIES):
-        bh_files = []
 
-        for fn in os.listdir(bh_path):
-            if re.match(RE_BH_FILE_COMPUTERS, fn):
-                bh_files.append(fn)
+class DomainGroup(BloodhoundObject):
+    # Objects are kept in large numbers by membership queries and `serve`
+    __slots__ = (
+        'raw_json', 'object_id', 'domain', 'sam_account_name', 'distinguished_name', 'name',
+        'description', 'member_object_ids', 'creation_timestamp', 'search_string', 'aces'
+    )
 
-        if not bh_files:
-            raise RuntimeError('No BloodHound computers files were found.')
+    FILE_PATTERN = RE_BH_FILE_GROUPS
+    FILE_TYPE = 'groups'
 
-        for path in bh_files:
-            with open(path, 'rt') as fo:
-                computers = json.loads(fo.read())
-
-            for c in computers['data']:
-                yield cls(c, search_properties=search_properties)
-
-    def matches_term(self, search_term: str) -> bool:
-        return True if search_term in self.search_string else False
-
-
-class DomainGroup:
     SEARCH_PROPERTIES = [
-        'objectid', 'domain', 'samaccountname', 'distinguishedname', 'name'
+        'objectid', 'domain', 'samaccountname', 'distinguishedname', 'name',
         'description'
     ]
 
     DEFAULT_SEARCH_PROPERTIES = ['objectid', 'samaccountname', 'description', 'name']
 
-    def __init__(self, data: dict, search_properties=DEFAULT_SEARCH_PROPERTIES):
+    # Top-level keys of Bloodhound objects used by the class
+    FIELDS = ['ObjectIdentifier', 'Properties', 'Members']
+
+    # Top-level keys to decode when the ACEs of objects are needed (see `ControlIndex`)
+    ACE_FIELDS = FIELDS + ['Aces']
+
+    # The `raw_json` variable holds the source text of the object, which is kept only when JSON
+    # output is needed.
+    def __init__(self, data: dict, search_properties=DEFAULT_SEARCH_PROPERTIES, raw_json=None):
         properties = data['Properties']
         properties['objectid'] = data.get('ObjectIdentifier', '')
 
-        self.json = json.dumps(data)
+        self.raw_json = raw_json
         self.object_id = properties.get('objectid') or ''
-        self.domain = properties.get('domain') or ''
+        self.domain = sys.intern(properties.get('domain') or '')
         self.sam_account_name = properties.get('samaccountname') or ''
         self.distinguished_name = properties.get('distinguishedname') or ''
         self.name = properties.get('name') or ''
         self.description = properties.get('description') or ''
-        self.member_object_ids = [m['ObjectIdentifier'] for m in data.get('Members', [])]
-
-        self.creation_date = ''
+        self.member_object_ids = {m['ObjectIdentifier'] for m in data.get('Members', [])}
+        self.aces = ace_edges(data)
 
-        if properties.get('whencreated'):
-            self.creation_date = datetime.fromtimestamp(properties.get('whencreated', 0))
+        self.creation_timestamp = properties.get('whencreated') or 0
 
         self.search_string = '\n'.join(
-            [properties.get(sp, '') for sp in search_properties]
+            [properties.get(sp) or '' for sp in search_properties]
         ).lower()
 
     def __str__(self):
@@ -217,29 +734,6 @@ class DomainGroup:
             f'      Member Count : {len(self.member_object_ids)}'
         )
 
-    # The `bh_path` variable holds the path to the folder containing the *.json files generated by
-    # Bloodhound.
-    @classmethod
-    def load_files(cls, bh_path='.', search_properties=DEFAULT_SEARCH_PROPERTIES):
-        bh_files = []
-
-        for fn in os.listdir(bh_path):
-            if re.match(RE_BH_FILE_GROUPS, fn):
-                bh_files.append(fn)
-
-        if not bh_files:
-            raise RuntimeError('No BloodHound groups files were found.')
-
-        for path in bh_files:
-            with open(path, 'rt') as fo:
-                groups = json.loads(fo.read())
-
-            for g in groups['data']:
-                yield cls(g, search_properties=search_properties)
-
-    def matches_term(self, search_term: str) -> bool:
-        return True if search_term in self.search_string else False
-
     def contains(self, object_id: str):
         return True if object_id in self.member_object_ids else False
 
@@ -0,0 +1,190 @@
+#!/usr/bin/env python3
+
+import hashlib
+import marshal
+import os
+import struct
+
+# Local imports
+from core.archive import source_file, source_name
+
+
+# Parsed objects are stored in the `shihtzu` folder of the user's cache directory
+# (`$XDG_CACHE_HOME`, or `~/.cache`), rather than next to the Bloodhound files. `marshal` isn't
+# safe against malicious data, and collections often come from untrusted sources: cache files
+# must never be shipped along with them, so they are only ever read from a folder that only the
+# user can write to.
+CACHE_DIR = 'shihtzu'
+
+# Bump whenever the attributes of the cached classes change
+CACHE_VERSION = 9
+
+# Objects are serialized in batches so that cached loads can still be consumed lazily
+CACHE_BATCH_SIZE = 1024
+
+# Batches are prefixed with their size, so that they are read in one go rather than by `marshal`
+CACHE_BATCH_HEADER = struct.Struct('<I')
+
+
+# Folder holding the cache files, created (only accessible to the user) if missing
+def cache_dir() -> str:
+    root = os.environ.get('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'), '.cache')
+
+    return os.path.join(root, CACHE_DIR)
+
+
+# The `options` variable holds the keyword arguments given to `load_file`, which affect the objects
+# being built and are thus part of the cache file name, along with the absolute path of the source
+# file (so that files of different collections sharing a name don't clash).
+def cache_path(path, cls, options: dict) -> str:
+    source = (os.path.abspath(source_file(path)), source_name(path))
+    key = hashlib.sha1(repr((source, cls.__name__, sorted(options.items()))).encode()).hexdigest()
+
+    return os.path.join(cache_dir(), f'{source_name(path)}.{key[:16]}.cache')
+
+
+# Cache files are invalidated whenever the size or the modification time of their source (or of
+# the archive holding it) changes
+def source_key(path) -> tuple:
+    st = os.stat(source_file(path))
+
+    return (CACHE_VERSION, st.st_size, st.st_mtime_ns)
+
+
+# Attributes of `obj` in the order of the slots of its class
+def object_row(obj) -> tuple:
+    return tuple([getattr(obj, slot) for slot in obj.__slots__])
+
+
+# Rebuilds objects of class `cls` from their attributes, without calling its constructor. Slots are
+# set through their descriptors. Rows that don't match the slots of the class (i.e. from a corrupted
+# cache file) raise `ValueError`.
+def row_objects(cls, rows: list):
+    setters = [getattr(cls, slot).__set__ for slot in cls.__slots__]
+    new = cls.__new__
+
+    for row in rows:
+        if type(row) is not tuple or len(row) != len(setters):
+            raise ValueError('Invalid cached object')
+
+        obj = new(cls)
+
+        for setter, value in zip(setters, row):
+            setter(obj, value)
+
+        yield obj
+
+
+# Returns an iterator over the objects of class `cls` of a cache file, or `None` if it is missing or
+# stale
+def open_cache(path: str, cls, key: tuple):
+    try:
+        fo = open(path, 'rb')
+    except OSError:
+        return None
+
+    try:
+        valid = read_batch(fo) == key
+    except Exception:
+        valid = False
+
+    if not valid:
+        fo.close()
+        return None
+
+    return read_batches(fo, cls)
+
+
+def read_batch(fo):
+    header = fo.read(CACHE_BATCH_HEADER.size)
+
+    if not header:
+        raise EOFError
+
+    size, = CACHE_BATCH_HEADER.unpack(header)
+    data = fo.read(size)
+
+    if len(data) != size:
+        raise ValueError('Truncated cache batch')
+
+    return marshal.loads(data)
+
+
+def write_batch(fo, value):
+    data = marshal.dumps(value)
+
+    fo.write(CACHE_BATCH_HEADER.pack(len(data)))
+    fo.write(data)
+
+
+def read_batches(fo, cls):
+    with fo:
+        while True:
+            try:
+                batch = read_batch(fo)
+            except EOFError:
+                return
+
+            if type(batch) is not list:
+                raise ValueError('Invalid cache batch')
+
+            yield from row_objects(cls, batch)
+
+
+# Yields `objects`, saving them to the cache as they are consumed.
+# The cache file is only moved into place once `path` has been entirely read, so partial loads
+# (i.e. when using `-n`) never leave an incomplete cache behind.
+def write_through(path: str, key: tuple, objects):
+    tmp_path = f'{path}.{os.getpid()}.tmp'
+
+    try:
+        os.makedirs(os.path.dirname(path), mode=0o700, exist_ok=True)
+        fo = open(tmp_path, 'wb')
+    except OSError:
+        yield from objects
+        return
+
+    complete = False
+
+    try:
+        write_batch(fo, key)
+
+        batch = []
+
+        for obj in objects:
+            batch.append(object_row(obj))
+
+            yield obj
+
+            if len(batch) >= CACHE_BATCH_SIZE:
+                write_batch(fo, batch)
+                batch = []
+
+        if batch:
+            write_batch(fo, batch)
+
+        complete = True
+    finally:
+        fo.close()
+
+        try:
+            if complete:
+                os.replace(tmp_path, path)
+            else:
+                os.remove(tmp_path)
+        except OSError:
+            pass
+
+
+# Loads the objects of class `cls` from the Bloodhound file at `path` from its cache if it is still
+# valid, or parses the file (and caches the result) otherwise.
+def load_cached(path, cls, **options):
+    key = source_key(path)
+    cpath = cache_path(path, cls, options)
+
+    cached = open_cache(cpath, cls, key)
+
+    if cached is not None:
+        yield from cached
+    else:
+        yield from write_through(cpath, key, cls.load_file(path, **options))
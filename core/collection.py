@@ -0,0 +1,200 @@
+#!/usr/bin/env python3
+
+# Local imports
+from core.bloodhound import DomainUser, DomainComputer, DomainGroup
+from core.graph import AttackGraph
+from core.index import AccessIndex, ControlIndex, MembershipIndex, PropertyIndex
+from core.timeline import TimestampColumns
+
+
+# Entry point to the objects of a Bloodhound collection. Objects are parsed from the files every
+# time they are requested. The keyword arguments of the methods below are those of `load_files`.
+class Collection:
+    # The `bh_path` variable holds the path to the folder containing the *.json files generated by
+    # Bloodhound (or to a SharpHound archive), or a list of such paths to load the collections of
+    # several domains as one.
+    def __init__(self, bh_path='.'):
+        self.bh_path = bh_path[0] if isinstance(bh_path, list) and len(bh_path) == 1 else bh_path
+
+    def load(self, cls, **options):
+        return cls.load_files(self.bh_path, **options)
+
+    def users(self, **options):
+        return self.load(DomainUser, **options)
+
+    def computers(self, **options):
+        return self.load(DomainComputer, **options)
+
+    def groups(self, **options):
+        return self.load(DomainGroup, **options)
+
+    def membership_index(self, **options) -> MembershipIndex:
+        options.pop('accept', None)
+
+        return MembershipIndex.from_groups(self.groups(**options))
+
+    def access_index(self, **options) -> AccessIndex:
+        options.pop('accept', None)
+        options['fields'] = DomainComputer.ACCESS_FIELDS
+
+        return AccessIndex.from_computers(self.computers(**options))
+
+    def control_index(self, **options) -> ControlIndex:
+        for k in ('accept', 'where'):
+            options.pop(k, None)
+
+        options['raw_json'] = False
+        index = ControlIndex()
+
+        for cls in (DomainUser, DomainComputer, DomainGroup):
+            for ado in self.load(cls, **dict(options, fields=cls.ACE_FIELDS)):
+                index.add_object(ado)
+
+        return index
+
+    def attack_graph(self, **options) -> AttackGraph:
+        for k in ('accept', 'where'):
+            options.pop(k, None)
+
+        options['raw_json'] = False
+
+        return AttackGraph.from_indexes(
+            self.membership_index(**options), self.access_index(**options),
+            self.control_index(**options)
+        )
+
+    def timestamp_columns(self, cls, **options) -> TimestampColumns:
+        return TimestampColumns(self.load(cls, **options))
+
+
+# Collection keeping every object it loads in memory, so that successive queries (i.e. when running
+# `shihtzu serve`) only parse the files once. Objects are kept per set of loading options, as these
+# affect the objects being built (i.e. `-m` or `-j`). Filters using the `exact` or `prefix` match
+# modes are answered from property indexes, built once per set of objects.
+class ResidentCollection(Collection):
+    def __init__(self, bh_path='.'):
+        super().__init__(bh_path)
+
+        self.objects = {}
+        self.indexes = {}
+
+        # Options the objects of each key were loaded with, as (other options, `raw_json`, `fields`)
+        self.loaded = {}
+        self.property_indexes = {}
+
+    @staticmethod
+    def options_key(cls, options: dict) -> tuple:
+        options = {
+            'search_properties': cls.DEFAULT_SEARCH_PROPERTIES, 'raw_json': False,
+            'fields': cls.FIELDS, **options
+        }
+
+        # These only affect how objects are loaded, not the objects themselves
+        for option in ('cache', 'jobs', 'accept'):
+            options.pop(option, None)
+
+        return (cls.__name__, repr(sorted(options.items())))
+
+    # Key of the objects loaded with `options`. Objects decoding more fields than requested, or
+    # holding their Bloodhound JSON when it isn't needed, can be used instead (i.e. when `batch`
+    # loads each type of objects once, with the fields needed by all of its queries).
+    def loaded_key(self, cls, options: dict):
+        key = self.options_key(cls, options)
+
+        if key in self.objects:
+            return key
+
+        base = self.options_key(cls, dict(options, raw_json=False, fields=None))
+        raw_json = options.get('raw_json', False)
+        fields = options.get('fields', cls.FIELDS)
+
+        for k, (k_base, k_raw_json, k_fields) in self.loaded.items():
+            if k_base != base or (raw_json and not k_raw_json):
+                continue
+
+            if k_fields is None or (fields is not None and set(fields) <= set(k_fields)):
+                return k
+
+        return key
+
+    def load(self, cls, **options):
+        # Objects filtered by `--where` are parsed again each time: predicates on durations depend
+        # on the time of the query, and every expression would keep its own set of objects
+        if options.get('where') is not None:
+            return super().load(cls, **options)
+
+        accept = options.get('accept')
+        key = self.loaded_key(cls, options)
+
+        if key not in self.objects:
+            options.pop('accept', None)
+            self.objects[key] = list(super().load(cls, **options))
+            self.loaded[key] = (
+                self.options_key(cls, dict(options, raw_json=False, fields=None)),
+                options.get('raw_json', False), options.get('fields', cls.FIELDS)
+            )
+
+        if not accept:
+            return iter(self.objects[key])
+
+        if getattr(accept, 'mode', 'substring') != 'substring' and accept.search_terms:
+            if key not in self.property_indexes:
+                self.property_indexes[key] = PropertyIndex(self.objects[key])
+
+            index = self.property_indexes[key]
+
+            return filter(accept, index.lookup(accept.search_terms, mode=accept.mode))
+
+        return filter(accept, self.objects[key])
+
+    def membership_index(self, **options) -> MembershipIndex:
+        key = self.options_key(DomainGroup, options)
+
+        if key not in self.indexes:
+            self.indexes[key] = super().membership_index(**options)
+
+        return self.indexes[key]
+
+    def access_index(self, **options) -> AccessIndex:
+        key = self.options_key(DomainComputer, dict(options, fields=DomainComputer.ACCESS_FIELDS))
+
+        if key not in self.indexes:
+            self.indexes[key] = super().access_index(**options)
+
+        return self.indexes[key]
+
+    def control_index(self, **options) -> ControlIndex:
+        for k in ('accept', 'where'):
+            options.pop(k, None)
+
+        options['raw_json'] = False
+        key = ('ControlIndex', self.options_key(DomainUser, options))
+
+        if key not in self.indexes:
+            self.indexes[key] = super().control_index(**options)
+
+        return self.indexes[key]
+
+    def attack_graph(self, **options) -> AttackGraph:
+        for k in ('accept', 'where'):
+            options.pop(k, None)
+
+        options['raw_json'] = False
+        key = ('AttackGraph', self.options_key(DomainUser, options))
+
+        if key not in self.indexes:
+            self.indexes[key] = super().attack_graph(**options)
+
+        return self.indexes[key]
+
+    # Columns are only memoized for whole sets of objects, not for those matching a filter
+    def timestamp_columns(self, cls, **options) -> TimestampColumns:
+        if options.get('accept') or options.get('where') is not None:
+            return super().timestamp_columns(cls, **options)
+
+        key = ('TimestampColumns', self.options_key(cls, options))
+
+        if key not in self.indexes:
+            self.indexes[key] = super().timestamp_columns(cls, **options)
+
+        return self.indexes[key]
@@ -0,0 +1,161 @@
+#!/usr/bin/env python3
+
+from concurrent.futures import ProcessPoolExecutor
+import hashlib
+import json
+
+# Local imports
+from core.archive import open_source
+from core.bloodhound import DomainUser, DomainComputer, DomainGroup, iter_bh_data
+
+
+# Logon timestamps change whenever accounts are used, which isn't a change of the objects
+DIFF_IGNORED_PROPERTIES = ('lastlogon', 'lastlogontimestamp')
+
+DIFF_CLASSES = (DomainUser, DomainComputer, DomainGroup)
+
+
+# Change of an object between two collections. The `change` variable holds "added", "removed" or
+# "changed", in which case `properties` holds the names of the properties whose value changed and
+# `members_added` and `members_removed` the object IDs of the members a group gained or lost.
+class ObjectChange:
+    __slots__ = (
+        'kind', 'change', 'object_id', 'name', 'properties', 'members_added', 'members_removed'
+    )
+
+    def __init__(self, kind: str, change: str, object_id: str, name: str):
+        self.kind = kind
+        self.change = change
+        self.object_id = object_id
+        self.name = name
+        self.properties = []
+        self.members_added = []
+        self.members_removed = []
+
+    def to_dict(self) -> dict:
+        return {attr: getattr(self, attr) for attr in self.__slots__}
+
+    def __str__(self):
+        sign = {'added': '+', 'removed': '-', 'changed': '~'}[self.change]
+        lines = [f'{sign} {self.name} ({self.object_id})']
+
+        if self.properties:
+            lines[0] += f": {', '.join(self.properties)}"
+
+        lines.extend(f'    + member {m}' for m in self.members_added)
+        lines.extend(f'    - member {m}' for m in self.members_removed)
+
+        return '\n'.join(lines)
+
+
+# Canonical digests of the properties (minus `DIFF_IGNORED_PROPERTIES`) and of the members of a
+# decoded Bloodhound object, which are the same for identical objects regardless of the order of
+# their keys or members.
+def object_digests(data: dict) -> tuple[bytes, bytes]:
+    properties = dict(data['Properties'])
+
+    for k in DIFF_IGNORED_PROPERTIES:
+        properties.pop(k, None)
+
+    properties_digest = hashlib.blake2b(
+        json.dumps(properties, sort_keys=True, separators=(',', ':')).encode(), digest_size=16
+    ).digest()
+
+    members = data.get('Members')
+
+    if not members:
+        return properties_digest, b''
+
+    members_digest = hashlib.blake2b(
+        '\n'.join(sorted(member_ids(data))).encode(), digest_size=16
+    ).digest()
+
+    return properties_digest, members_digest
+
+
+def member_ids(data: dict) -> set[str]:
+    return {m['ObjectIdentifier'] for m in data.get('Members') or ()}
+
+
+def object_name(data: dict) -> str:
+    properties = data['Properties']
+
+    return properties.get('samaccountname') or properties.get('name') or \
+           data.get('ObjectIdentifier') or ''
+
+
+# Decoded objects of class `cls` in the collection at `bh_path`, one file at a time
+def iter_objects(cls, bh_path: str):
+    for path in cls.find_files(bh_path):
+        with open_source(path) as fo:
+            for data, _ in iter_bh_data(fo, fields=cls.FIELDS):
+                yield data
+
+
+# Compares the objects of class `cls` of two collections. Only the digests of the old objects are
+# kept in memory while the new ones are read, along with the new objects that changed. The old
+# version of these is then read back in a second pass over the old collection, to find out which
+# of their properties and members changed. Memory thus grows with the number of objects and of
+# changes, not with the size of the collections.
+def diff_objects(cls, old_path: str, new_path: str) -> list[ObjectChange]:
+    kind = cls.__name__.replace('Domain', '').lower()
+    old = {}
+
+    for data in iter_objects(cls, old_path):
+        old[data.get('ObjectIdentifier')] = (object_digests(data), object_name(data))
+
+    changes = []
+    changed = {}
+
+    for data in iter_objects(cls, new_path):
+        object_id = data.get('ObjectIdentifier')
+        entry = old.pop(object_id, None)
+
+        if entry is None:
+            changes.append(ObjectChange(kind, 'added', object_id, object_name(data)))
+        elif entry[0] != object_digests(data):
+            change = ObjectChange(kind, 'changed', object_id, object_name(data))
+            changed[object_id] = (change, data)
+            changes.append(change)
+
+    for object_id, (_, name) in old.items():
+        changes.append(ObjectChange(kind, 'removed', object_id, name))
+
+    if changed:
+        for data in iter_objects(cls, old_path):
+            object_id = data.get('ObjectIdentifier')
+
+            if object_id not in changed:
+                continue
+
+            change, new_data = changed[object_id]
+            old_properties, new_properties = data['Properties'], new_data['Properties']
+
+            change.properties = sorted(
+                k for k in old_properties.keys() | new_properties.keys()
+                if k not in DIFF_IGNORED_PROPERTIES and
+                   old_properties.get(k) != new_properties.get(k)
+            )
+
+            old_members, new_members = member_ids(data), member_ids(new_data)
+            change.members_added = sorted(new_members - old_members)
+            change.members_removed = sorted(old_members - new_members)
+
+    return changes
+
+
+# Compares the users, computers and groups of two collections (folders or SharpHound archives). If
+# `jobs` is greater than 1, object types are compared concurrently by a pool of processes. Yields
+# the class of each type along with its changes.
+def diff_collections(old_path: str, new_path: str, jobs=1):
+    if jobs <= 1:
+        for cls in DIFF_CLASSES:
+            yield cls, diff_objects(cls, old_path, new_path)
+
+        return
+
+    with ProcessPoolExecutor(max_workers=min(jobs, len(DIFF_CLASSES))) as pool:
+        futures = [pool.submit(diff_objects, cls, old_path, new_path) for cls in DIFF_CLASSES]
+
+        for cls, future in zip(DIFF_CLASSES, futures):
+            yield cls, future.result()
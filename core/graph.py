@@ -0,0 +1,190 @@
+#!/usr/bin/env python3
+
+from array import array
+
+# Local imports
+from core.bloodhound import DomainGroup
+from core.index import AccessIndex, ControlIndex, MembershipIndex
+
+
+# Relative ID of the Domain Admins group, the default target of `find-paths`
+DOMAIN_ADMINS_RID = '-512'
+
+
+# Directed graph of the relations that can be abused to take control of objects: group
+# memberships (`MemberOf`), local admin and RDP rights (`AdminTo`, `CanRDP`), sessions
+# (`HasSession`, from the computer to the user whose credentials can be stolen from it) and ACEs
+# (named after their right). Object IDs are mapped to dense node IDs and edge labels are interned
+# into small integers. Once `freeze` is called, outbound edges are stored in compressed sparse row
+# form: the targets and labels of the edges of node `n` are found in `adjacency` and `labels`
+# between `offsets[n]` and `offsets[n + 1]`, so the whole graph fits in a few flat arrays.
+class AttackGraph:
+    def __init__(self, control: ControlIndex = None):
+        self.control = control
+        self.nodes = {}
+        self.object_ids = []
+        self.label_names = []
+        self.label_ids = {}
+
+        # Edges are appended to these before being sorted into the arrays below by `freeze`
+        self.edge_sources = array('I')
+        self.edge_targets = array('I')
+        self.edge_labels = array('I')
+
+        self.offsets = None
+        self.adjacency = None
+        self.labels = None
+
+    def node(self, object_id: str) -> int:
+        node = self.nodes.get(object_id)
+
+        if node is None:
+            node = self.nodes[object_id] = len(self.object_ids)
+            self.object_ids.append(object_id)
+
+        return node
+
+    def label(self, label: str) -> int:
+        label_id = self.label_ids.get(label)
+
+        if label_id is None:
+            label_id = self.label_ids[label] = len(self.label_names)
+            self.label_names.append(label)
+
+        return label_id
+
+    def add_edge(self, source_id: str, label: str, target_id: str):
+        self.edge_sources.append(self.node(source_id))
+        self.edge_targets.append(self.node(target_id))
+        self.edge_labels.append(self.label(label))
+
+    # Adds edges labeled `label` from each of `source_ids` to `target_id`
+    def add_edges_to(self, source_ids, label: str, target_id: str):
+        node = self.node
+        sources = array('I', [node(object_id) for object_id in source_ids])
+
+        self.edge_sources.extend(sources)
+        self.edge_targets.extend(array('I', [node(target_id)]) * len(sources))
+        self.edge_labels.extend(array('I', [self.label(label)]) * len(sources))
+
+    # Sorts the edges by source node (counting sort) into the compressed sparse row arrays
+    def freeze(self):
+        count = len(self.object_ids)
+        offsets = array('I', bytes(4 * (count + 1)))
+
+        for source in self.edge_sources:
+            offsets[source + 1] += 1
+
+        for n in range(count):
+            offsets[n + 1] += offsets[n]
+
+        adjacency = array('I', bytes(4 * len(self.edge_targets)))
+        labels = array('I', bytes(4 * len(self.edge_labels)))
+        positions = offsets[:-1]
+
+        for source, target, label in zip(self.edge_sources, self.edge_targets, self.edge_labels):
+            p = positions[source]
+            adjacency[p] = target
+            labels[p] = label
+            positions[source] = p + 1
+
+        self.offsets, self.adjacency, self.labels = offsets, adjacency, labels
+        self.edge_sources = self.edge_targets = self.edge_labels = None
+
+    # The nodes of the objects of `control` are their positions in the index, and the labels of
+    # ACE edges the IDs of their rights, so these edges are copied from the index as is.
+    @classmethod
+    def from_indexes(cls, membership: MembershipIndex, access: AccessIndex,
+                     control: ControlIndex):
+        graph = cls(control)
+
+        for ado in control.objects:
+            graph.nodes.setdefault(ado.object_id, len(graph.object_ids))
+            graph.object_ids.append(ado.object_id)
+
+        graph.label_names = list(control.rights)
+        graph.label_ids = dict(control.right_ids)
+
+        for principal, pairs in control.outbound.items():
+            graph.edge_sources.extend(array('I', [graph.node(principal)]) * (len(pairs) // 2))
+            graph.edge_targets.extend(pairs[::2])
+            graph.edge_labels.extend(pairs[1::2])
+
+        for group_id, member_ids in membership.members.items():
+            graph.add_edges_to(member_ids, 'MemberOf', group_id)
+
+        for c in access.computers:
+            graph.add_edges_to(c.local_admins, 'AdminTo', c.object_id)
+            graph.add_edges_to(c.remote_desktop_users, 'CanRDP', c.object_id)
+
+            for object_id in c.sessions:
+                graph.add_edge(c.object_id, 'HasSession', object_id)
+
+        graph.freeze()
+
+        return graph
+
+    # Object IDs of the Domain Admins groups of the collection
+    def domain_admins(self) -> list[str]:
+        return [
+            ado.object_id for ado in self.control.objects
+            if isinstance(ado, DomainGroup) and ado.object_id.endswith(DOMAIN_ADMINS_RID)
+        ]
+
+    # Multi-source breadth-first search from `source_ids` to `target_ids`. Returns the shortest
+    # path to each reachable target, closest targets first, as a list of object IDs along with the
+    # labels of the edges between them. Every path starts from the source closest to its target.
+    def shortest_paths(self, source_ids, target_ids) -> list[tuple[list, list]]:
+        offsets, adjacency, labels = self.offsets, self.adjacency, self.labels
+
+        # Node and edge label each node was reached from (-2 for sources, -1 if not reached yet)
+        parents = array('i', [-1]) * len(self.object_ids)
+        parent_labels = array('I', bytes(4 * len(self.object_ids)))
+        remaining = {self.nodes[t] for t in target_ids if t in self.nodes}
+        frontier = []
+        found = []
+
+        for object_id in source_ids:
+            node = self.nodes.get(object_id)
+
+            if node is not None and parents[node] == -1:
+                parents[node] = -2
+                frontier.append(node)
+
+                if node in remaining:
+                    remaining.discard(node)
+                    found.append(node)
+
+        while frontier and remaining:
+            next_frontier = []
+
+            for node in frontier:
+                for e in range(offsets[node], offsets[node + 1]):
+                    nxt = adjacency[e]
+
+                    if parents[nxt] != -1:
+                        continue
+
+                    parents[nxt] = node
+                    parent_labels[nxt] = labels[e]
+                    next_frontier.append(nxt)
+
+                    if nxt in remaining:
+                        remaining.discard(nxt)
+                        found.append(nxt)
+
+            frontier = next_frontier
+
+        paths = []
+
+        for node in found:
+            nodes, edge_labels = [node], []
+
+            while parents[node] != -2:
+                edge_labels.append(self.label_names[parent_labels[node]])
+                node = parents[node]
+                nodes.append(node)
+
+            paths.append(([self.object_ids[n] for n in reversed(nodes)], edge_labels[::-1]))
+
+        return paths
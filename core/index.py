@@ -0,0 +1,272 @@
+#!/usr/bin/env python3
+
+from array import array
+from bisect import bisect_left
+
+# Local imports
+from core.bloodhound import DomainComputer, DomainGroup
+from core.match import prefix_free, search_values
+
+
+# Maps group object IDs to their members and member object IDs to the groups they belong to, so
+# membership queries only require a single pass over the groups files.
+class MembershipIndex:
+    def __init__(self):
+        self.groups = {}
+        self.members = {}
+        self.memberships = {}
+
+        # Transitive closures are shared by every group of a strongly connected component and by
+        # every query answered from this index.
+        self.member_closures = {}
+        self.membership_closures = {}
+        self.positions = {}
+
+    def add_group(self, group: DomainGroup):
+        self.groups[group.object_id] = group
+        self.positions.setdefault(group.object_id, len(self.positions))
+        self.members[group.object_id] = group.member_object_ids
+
+        for object_id in group.member_object_ids:
+            self.memberships.setdefault(object_id, []).append(group.object_id)
+
+    @classmethod
+    def from_groups(cls, groups):
+        index = cls()
+
+        for g in groups:
+            index.add_group(g)
+
+        return index
+
+    def groups_of(self, object_id: str, recursive=False) -> list[DomainGroup]:
+        if not recursive:
+            return [self.groups[gid] for gid in self.memberships.get(object_id, [])]
+
+        group_ids = self.closure(object_id, self.memberships, self.membership_closures)
+
+        return [
+            self.groups[gid] for gid in sorted(group_ids, key=self.positions.get)
+            if gid != object_id
+        ]
+
+    def members_of(self, group_id: str, recursive=False) -> set[str]:
+        if not recursive:
+            return self.members.get(group_id, set())
+
+        return self.closure(group_id, self.members, self.member_closures)
+
+    # Returns every node reachable from `start` through `edges`, memoizing the result in `memo`.
+    # Cycles are handled by computing strongly connected components (Tarjan's algorithm, run
+    # iteratively to avoid hitting the recursion limit on deeply nested groups): all nodes of a
+    # component share the same closure, and components are completed before their predecessors.
+    @staticmethod
+    def closure(start: str, edges: dict, memo: dict) -> set[str]:
+        if start in memo:
+            return memo[start]
+
+        if start not in edges:
+            return set()
+
+        index = {start: 0}
+        low = {start: 0}
+        stack = [start]
+        on_stack = {start}
+        work = [(start, iter(edges[start]))]
+
+        while work:
+            node, successors = work[-1]
+
+            for nxt in successors:
+                if nxt in memo or nxt not in edges:
+                    continue
+
+                if nxt not in index:
+                    index[nxt] = low[nxt] = len(index)
+                    stack.append(nxt)
+                    on_stack.add(nxt)
+                    work.append((nxt, iter(edges[nxt])))
+                    break
+
+                if nxt in on_stack:
+                    low[node] = min(low[node], index[nxt])
+            else:
+                work.pop()
+
+                if work:
+                    parent = work[-1][0]
+                    low[parent] = min(low[parent], low[node])
+
+                if low[node] != index[node]:
+                    continue
+
+                component = []
+
+                while True:
+                    w = stack.pop()
+                    on_stack.discard(w)
+                    component.append(w)
+
+                    if w == node:
+                        break
+
+                reachable = set()
+
+                for w in component:
+                    for nxt in edges[w]:
+                        reachable.add(nxt)
+
+                        if nxt in memo:
+                            reachable |= memo[nxt]
+
+                for w in component:
+                    memo[w] = reachable
+
+        return memo[start]
+
+
+# Maps the object IDs of principals to the computers they have sessions on, are local admins of or
+# can connect to using RDP, so that access queries only require a single pass over the computers
+# files (loaded with `DomainComputer.ACCESS_FIELDS`).
+class AccessIndex:
+    RELATIONS = ('sessions', 'local_admins', 'remote_desktop_users')
+
+    def __init__(self):
+        self.computers = []
+        self.relations = {relation: {} for relation in self.RELATIONS}
+
+    def add_computer(self, computer: DomainComputer):
+        position = len(self.computers)
+        self.computers.append(computer)
+
+        for relation, principals in self.relations.items():
+            for object_id in getattr(computer, relation):
+                principals.setdefault(object_id, []).append(position)
+
+    @classmethod
+    def from_computers(cls, computers):
+        index = cls()
+
+        for c in computers:
+            index.add_computer(c)
+
+        return index
+
+    # Returns the computers related to any of `object_ids` through `relation`, in their original
+    # order
+    def computers_of(self, object_ids, relation: str) -> list[DomainComputer]:
+        principals = self.relations[relation]
+        positions = set()
+
+        for object_id in object_ids:
+            positions.update(principals.get(object_id, ()))
+
+        return [self.computers[p] for p in sorted(positions)]
+
+
+# Edges of the ACL graph: principals and the rights their ACEs grant them on users, computers and
+# groups (loaded with the `ACE_FIELDS` of their class). Outbound edges are kept per principal object
+# ID as flat arrays of (target position, right ID) pairs, right names being interned into small
+# integers, so that the objects controlled by any number of principals are found with a lookup
+# each. Inbound edges are the ACEs of the targets themselves.
+class ControlIndex:
+    def __init__(self):
+        self.objects = []
+        self.positions = {}
+        self.rights = []
+        self.right_ids = {}
+        self.outbound = {}
+
+    def add_object(self, ado):
+        position = len(self.objects)
+        self.objects.append(ado)
+        self.positions.setdefault(ado.object_id, position)
+
+        for principal, right in ado.aces:
+            right_id = self.right_ids.get(right)
+
+            if right_id is None:
+                right_id = self.right_ids[right] = len(self.rights)
+                self.rights.append(right)
+
+            edges = self.outbound.get(principal)
+
+            if edges is None:
+                edges = self.outbound[principal] = array('I')
+
+            edges.append(position)
+            edges.append(right_id)
+
+    @classmethod
+    def from_objects(cls, objects):
+        index = cls()
+
+        for ado in objects:
+            index.add_object(ado)
+
+        return index
+
+    # Object of the index holding `object_id`, if any
+    def get(self, object_id: str):
+        position = self.positions.get(object_id)
+
+        return None if position is None else self.objects[position]
+
+    # Returns the (principal object ID, right name, target object) edges of the objects controlled
+    # by any of `object_ids`
+    def controlled_by(self, object_ids) -> list[tuple]:
+        edges = []
+
+        for object_id in dict.fromkeys(object_ids):
+            pairs = self.outbound.get(object_id, ())
+
+            edges.extend(
+                (object_id, self.rights[r], self.objects[p])
+                for p, r in zip(pairs[::2], pairs[1::2])
+            )
+
+        return edges
+
+    # Returns the (principal object ID, right name) pairs of the principals controlling the object
+    # holding `object_id`
+    def controllers_of(self, object_id: str) -> list[tuple]:
+        ado = self.get(object_id)
+
+        return list(ado.aces) if ado is not None else []
+
+
+# Maps the values of the searched properties of objects (see `search_values`) to the positions of
+# the objects holding them, so that `--exact` lookups take constant time per search term. Values
+# are also kept sorted, so that `--prefix` lookups only take a binary search per term (plus the
+# matching values).
+class PropertyIndex:
+    def __init__(self, objects: list):
+        self.objects = objects
+        self.positions = {}
+
+        for i, ado in enumerate(objects):
+            for value in search_values(ado.search_string):
+                if value:
+                    self.positions.setdefault(value, []).append(i)
+
+        self.values = sorted(self.positions)
+
+    # Returns the objects having a value equal to (or, in the `prefix` mode, starting with) any of
+    # `terms`, in their original order.
+    def lookup(self, terms: list[str], mode='exact') -> list:
+        found = set()
+
+        if mode == 'exact':
+            for term in terms:
+                found.update(self.positions.get(term, ()))
+        else:
+            values = self.values
+
+            for term in prefix_free(terms):
+                i = bisect_left(values, term)
+
+                while i < len(values) and values[i].startswith(term):
+                    found.update(self.positions[values[i]])
+                    i += 1
+
+        return [self.objects[i] for i in sorted(found)]
@@ -0,0 +1,154 @@
+#!/usr/bin/env python3
+
+from bisect import bisect_right
+
+
+# Below this number of search terms, plain substring checks are faster than walking the automaton
+AUTOMATON_MIN_TERMS = 16
+
+# Ways search terms can match the searched properties of objects (`--exact` and `--prefix`)
+MATCH_MODES = ('substring', 'exact', 'prefix')
+
+
+# Values of the searched properties of an object, which are stored in its `search_string`
+def search_values(search_string: str) -> list[str]:
+    return search_string.split('\n')
+
+
+# Removes the terms that start with another term, which would match a subset of the values the
+# shorter term matches. In the resulting sorted list, the only term that may be a prefix of a value
+# is the greatest term not greater than the value.
+def prefix_free(terms) -> list[str]:
+    result = []
+
+    for term in sorted(set(terms)):
+        if not result or not term.startswith(result[-1]):
+            result.append(term)
+
+    return result
+
+
+# Matches strings against any number of search terms in a single scan. Few terms are checked with
+# plain substring searches, while large term lists (i.e. from `-f`) are compiled into an
+# Aho-Corasick automaton so each string is scanned once regardless of the number of terms.
+# In the `exact` and `prefix` modes, strings are `search_string`s and their values (see
+# `search_values`) are looked up in a set of the terms, or in their sorted list.
+class TermMatcher:
+    def __init__(self, terms: list[str], mode='substring'):
+        self.terms = list(dict.fromkeys(t for t in terms if t))
+        self.mode = mode
+        self.goto = self.fail = self.output = None
+
+        if mode == 'exact':
+            self.term_set = set(self.terms)
+        elif mode == 'prefix':
+            self.terms = prefix_free(self.terms)
+        elif len(self.terms) >= AUTOMATON_MIN_TERMS:
+            self.build_automaton()
+
+    def build_automaton(self):
+        goto = [{}]
+        output = [False]
+
+        for term in self.terms:
+            state = 0
+
+            for c in term:
+                nxt = goto[state].get(c)
+
+                if nxt is None:
+                    nxt = goto[state][c] = len(goto)
+                    goto.append({})
+                    output.append(False)
+
+                state = nxt
+
+            output[state] = True
+
+        # Breadth-first traversal to compute the failure links. A state is accepting if any of the
+        # states its failure links lead to is.
+        fail = [0] * len(goto)
+        queue = list(goto[0].values())
+
+        for state in queue:
+            for c, nxt in goto[state].items():
+                f = fail[state]
+
+                while f and c not in goto[f]:
+                    f = fail[f]
+
+                fail[nxt] = goto[f].get(c, 0)
+                output[nxt] = output[nxt] or output[fail[nxt]]
+
+                queue.append(nxt)
+
+        self.goto, self.fail, self.output = goto, fail, output
+
+    def matches_value(self, value: str) -> bool:
+        if self.mode == 'exact':
+            return value in self.term_set
+
+        i = bisect_right(self.terms, value)
+
+        return i > 0 and value.startswith(self.terms[i - 1])
+
+    def matches(self, string: str) -> bool:
+        if self.mode != 'substring':
+            for value in search_values(string):
+                if self.matches_value(value):
+                    return True
+
+            return False
+
+        if self.goto is None:
+            for t in self.terms:
+                if t in string:
+                    return True
+
+            return False
+
+        goto, fail, output = self.goto, self.fail, self.output
+        state = 0
+
+        for c in string:
+            while state and c not in goto[state]:
+                state = fail[state]
+
+            state = goto[state].get(c, 0)
+
+            if output[state]:
+                return True
+
+        return False
+
+
+# Picklable predicate over Active Directory objects, so that objects can be filtered by the worker
+# processes when loading files in parallel.
+class ObjectFilter:
+    def __init__(self, search_terms: list[str] = None, enabled=False, object_ids: set = None,
+                 mode='substring'):
+        self.search_terms = search_terms or []
+        self.enabled = enabled
+        self.object_ids = object_ids
+        self.mode = mode
+        self.matcher = None
+
+    # The matcher is built on first use rather than pickled along with the filter
+    def __getstate__(self):
+        return dict(self.__dict__, matcher=None)
+
+    def __call__(self, ado) -> bool:
+        # Groups can't be disabled
+        if self.enabled and not getattr(ado, 'enabled', True):
+            return False
+
+        if self.object_ids is not None and ado.object_id not in self.object_ids:
+            return False
+
+        if self.search_terms:
+            if self.matcher is None:
+                self.matcher = TermMatcher(self.search_terms, mode=self.mode)
+
+            return self.matcher.matches(ado.search_string)
+
+        return True
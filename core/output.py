@@ -0,0 +1,55 @@
+#!/usr/bin/env python3
+
+from io import DEFAULT_BUFFER_SIZE
+
+
+# Results are written out once this many characters have been buffered
+OUTPUT_BUFFER_SIZE = DEFAULT_BUFFER_SIZE * 8
+
+OUTPUT_FORMATS = ('text', 'jsonl', 'json-array')
+
+
+# Writes the results of a query to `fo`, batching them into few large writes. Results are written
+# one per line (`text`, also used by `-j`), or are the Bloodhound JSON of objects, written as JSON
+# Lines (`jsonl`) or as a single JSON array (`json-array`). The source text of objects is written
+# as is, except for line breaks being removed from it in the `jsonl` format (these can only appear
+# between JSON tokens, never inside strings).
+class ResultWriter:
+    def __init__(self, fo, fmt='text', buffer_size=OUTPUT_BUFFER_SIZE):
+        self.fo = fo
+        self.fmt = fmt
+        self.buffer_size = buffer_size
+        self.parts = []
+        self.size = 0
+        self.count = 0
+
+    def write(self, result: str):
+        if self.fmt == 'json-array':
+            self.parts.append(',\n' if self.count else '[\n')
+            self.parts.append(result)
+        else:
+            if self.fmt == 'jsonl' and ('\n' in result or '\r' in result):
+                result = result.replace('\r', '').replace('\n', '')
+
+            self.parts.append(result)
+            self.parts.append('\n')
+
+        self.count += 1
+        self.size += len(result)
+
+        if self.size >= self.buffer_size:
+            self.flush()
+
+    def flush(self):
+        if self.parts:
+            self.fo.write(''.join(self.parts))
+            self.parts = []
+            self.size = 0
+
+        self.fo.flush()
+
+    def close(self):
+        if self.fmt == 'json-array':
+            self.parts.append('\n]\n' if self.count else '[]\n')
+
+        self.flush()
@@ -0,0 +1,269 @@
+#!/usr/bin/env python3
+
+import ast
+import re
+import time
+
+
+# Tokens of `--where` expressions. Numbers may be followed by a unit, making them durations
+RE_PREDICATE_TOKEN = re.compile(
+    r'\s*(?:'
+    r'(?P<number>-?\d+(?:\.\d+)?)(?P<unit>[smhdwy])?(?![\w.])|'
+    r'(?P<string>"(?:[^"\\]|\\.)*"|\'(?:[^\'\\]|\\.)*\')|'
+    r'(?P<operator>==|!=|<=|>=|<|>|=|~|\(|\))|'
+    r'(?P<name>[A-Za-z_][A-Za-z0-9_]*)'
+    r')'
+)
+
+# Durations are converted to seconds
+PREDICATE_UNITS = {
+    's': 1, 'm': 60, 'h': 60 * 60, 'd': 24 * 60 * 60, 'w': 7 * 24 * 60 * 60,
+    'y': 365 * 24 * 60 * 60
+}
+
+PREDICATE_KEYWORDS = ('and', 'or', 'not', 'true', 'false', 'null')
+
+# Operators to use when the operands of a comparison are swapped (i.e. `90d > lastlogon`)
+PREDICATE_SWAPPED = {'==': '==', '!=': '!=', '<': '>', '<=': '>=', '>': '<', '>=': '<='}
+
+
+# Age in seconds of a Bloodhound timestamp at `now`. Timestamps that were never set (which
+# Bloodhound stores as 0 or -1) are infinitely old.
+def timestamp_age(timestamp, now: float) -> float:
+    if type(timestamp) not in (int, float) or timestamp <= 0:
+        return float('inf')
+
+    return now - timestamp
+
+
+# Whether `value` (a string or a list of strings, i.e. `serviceprincipalnames`) contains `term`
+def value_contains(value, term: str) -> bool:
+    if type(value) is str:
+        return term in value.lower()
+
+    if type(value) is list:
+        for v in value:
+            if type(v) is str and term in v.lower():
+                return True
+
+    return False
+
+
+# Boolean expression over the properties of Bloodhound objects (see `--where`), evaluated against
+# the decoded JSON of objects before they are built. For example:
+#
+#   pwdneverexpires and lastlogon > 90d and not description ~ "service"
+#
+# Properties are referred to by their Bloodhound names, and are compared with strings (ignoring
+# case), numbers, `true`, `false` or `null`. The `~` operator checks whether a string (or any
+# string of a list) contains a value. Comparing a timestamp with a duration (a number followed by
+# `s`, `m`, `h`, `d`, `w` or `y`) compares its age: `lastlogon > 90d` matches objects whose last
+# logon is older than 90 days (or which never logged on). A property alone is true if it is set to
+# a non-empty value.
+#
+# Expressions are compiled into a single Python function. Predicates are picklable (so they can be
+# sent to worker processes along with the expression) and their `repr` is their expression. As
+# durations are relative to the time predicates are created at, resident collections don't memoize
+# the objects they filter.
+class Predicate:
+    def __init__(self, expression: str, now: float = None):
+        self.expression = expression
+        self.now = time.time() if now is None else now
+        self.function = None
+        self.source = self.compile()
+
+    def __repr__(self):
+        return f'Predicate({self.expression!r})'
+
+    # The compiled function is rebuilt on first use rather than pickled along with the predicate
+    def __getstate__(self):
+        return dict(self.__dict__, function=None)
+
+    def __call__(self, data: dict) -> bool:
+        if self.function is None:
+            namespace = {
+                '__builtins__': {}, 'bool': bool, 'type': type, 'int': int, 'float': float,
+                'str': str, 'AGE': timestamp_age, 'CONTAINS': value_contains, 'NOW': self.now
+            }
+
+            self.function = eval(self.source, namespace)
+
+        return self.function(data)
+
+    def tokenize(self) -> list[tuple]:
+        tokens = []
+        pos = 0
+        expression = self.expression.rstrip()
+
+        while pos < len(expression):
+            match = RE_PREDICATE_TOKEN.match(expression, pos)
+
+            if not match or match.end() == pos:
+                raise ValueError(f'Invalid `--where` expression at position {pos}: {expression}')
+
+            kind = match.lastgroup if match.lastgroup != 'unit' else 'number'
+
+            if kind == 'number':
+                number = float(match.group('number'))
+                number = int(number) if number.is_integer() else number
+
+                if match.group('unit'):
+                    tokens.append(('duration', number * PREDICATE_UNITS[match.group('unit')]))
+                else:
+                    tokens.append(('number', number))
+            elif kind == 'string':
+                tokens.append(('string', ast.literal_eval(match.group('string')).lower()))
+            elif kind == 'name' and match.group('name').lower() in PREDICATE_KEYWORDS:
+                tokens.append(('keyword', match.group('name').lower()))
+            elif kind == 'name':
+                tokens.append(('name', match.group('name').lower()))
+            else:
+                tokens.append(('operator', '==' if match.group('operator') == '=' else \
+                               match.group('operator')))
+
+            pos = match.end()
+
+        return tokens
+
+    # Recursive descent parser turning the expression into the source of a lambda over the decoded
+    # JSON of objects (`d`). Values of properties are bound to `v<N>` so they are looked up once.
+    def compile(self) -> str:
+        self.tokens = self.tokenize()
+        self.pos = 0
+        self.variables = 0
+
+        if not self.tokens:
+            raise ValueError('Empty `--where` expression')
+
+        body = self.parse_or()
+
+        if self.pos < len(self.tokens):
+            self.error('Unexpected token')
+
+        del self.tokens, self.pos, self.variables
+
+        return f'lambda d: bool({body})'
+
+    def error(self, message: str):
+        if self.pos < len(self.tokens):
+            message = f'{message}: {self.tokens[self.pos][1]!r}'
+
+        raise ValueError(f'{message} in `--where` expression: {self.expression}')
+
+    def peek(self) -> tuple:
+        return self.tokens[self.pos] if self.pos < len(self.tokens) else (None, None)
+
+    def accept(self, kind: str, value=None) -> bool:
+        if self.peek()[0] == kind and (value is None or self.peek()[1] == value):
+            self.pos += 1
+            return True
+
+        return False
+
+    def parse_or(self) -> str:
+        terms = [self.parse_and()]
+
+        while self.accept('keyword', 'or'):
+            terms.append(self.parse_and())
+
+        return terms[0] if len(terms) == 1 else f"({' or '.join(terms)})"
+
+    def parse_and(self) -> str:
+        terms = [self.parse_not()]
+
+        while self.accept('keyword', 'and'):
+            terms.append(self.parse_not())
+
+        return terms[0] if len(terms) == 1 else f"({' and '.join(terms)})"
+
+    def parse_not(self) -> str:
+        if self.accept('keyword', 'not'):
+            return f'(not {self.parse_not()})'
+
+        return self.parse_comparison()
+
+    def parse_comparison(self) -> str:
+        if self.accept('operator', '('):
+            body = self.parse_or()
+
+            if not self.accept('operator', ')'):
+                self.error('Expected ")"')
+
+            return body
+
+        left = self.parse_operand()
+        kind, operator = self.peek()
+
+        if kind != 'operator' or operator in '()':
+            if left[0] != 'name':
+                self.error('Expected a comparison operator')
+
+            return f'({self.lookup(left[1])} not in (None, False, 0, "", []))'
+
+        self.pos += 1
+        right = self.parse_operand()
+
+        if left[0] != 'name' and right[0] == 'name':
+            left, right = right, left
+            operator = PREDICATE_SWAPPED.get(operator, operator)
+
+            if operator == '~':
+                self.error('The value must follow `~`')
+
+        if left[0] != 'name' or right[0] == 'name':
+            self.error('Comparisons must be between a property and a value')
+
+        return self.comparison(self.lookup(left[1]), operator, right)
+
+    def parse_operand(self) -> tuple:
+        kind, value = self.peek()
+
+        if kind in ('name', 'number', 'duration', 'string'):
+            self.pos += 1
+            return kind, value
+
+        if kind == 'keyword' and value in ('true', 'false', 'null'):
+            self.pos += 1
+            return 'constant', {'true': True, 'false': False, 'null': None}[value]
+
+        self.error('Expected a property or a value')
+
+    @staticmethod
+    def lookup(name: str) -> str:
+        if name == 'objectid':
+            return "d.get('ObjectIdentifier')"
+
+        return f"d['Properties'].get({name!r})"
+
+    def comparison(self, lookup: str, operator: str, operand: tuple) -> str:
+        kind, value = operand
+        v = f'v{self.variables}'
+        self.variables += 1
+
+        if operator == '~':
+            if kind != 'string':
+                self.error('`~` requires a string value')
+
+            return f'CONTAINS({lookup}, {value!r})'
+
+        if kind == 'constant':
+            if operator not in ('==', '!='):
+                self.error(f'`{operator}` cannot be used with `true`, `false` or `null`')
+
+            return f"({lookup} {'is' if operator == '==' else 'is not'} {value!r})"
+
+        if kind == 'duration':
+            return f'(AGE({lookup}, NOW) {operator} {value!r})'
+
+        # Missing or mistyped properties are never equal to the value
+        negate = operator == '!='
+
+        if negate:
+            operator = '=='
+
+        if kind == 'string':
+            check = f'(type({v} := {lookup}) is str and {v}.lower() {operator} {value!r})'
+        else:
+            check = f'(type({v} := {lookup}) in (int, float) and {v} {operator} {value!r})'
+
+        return f'(not {check})' if negate else check
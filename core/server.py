@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+
+from contextlib import redirect_stderr, redirect_stdout
+from io import DEFAULT_BUFFER_SIZE, TextIOWrapper
+import json
+import os
+import shlex
+import signal
+import socket
+import socketserver
+import stat
+import sys
+
+
+# Requests are sent as a single JSON line holding the arguments of the client and its search terms
+# (which may have been read from the client's stdin). Responses hold the output of the query,
+# followed by a NUL byte and the exit status of the query.
+STATUS_SEPARATOR = b'\0'
+
+
+class QueryHandler(socketserver.StreamRequestHandler):
+    wbufsize = DEFAULT_BUFFER_SIZE
+
+    def handle(self):
+        # Connections sending no request (i.e. from `remove_stale_socket`) or a malformed one are
+        # closed without answering
+        try:
+            request = json.loads(self.rfile.readline())
+            argv, search_terms = request['argv'], request['search_terms']
+        except (ValueError, TypeError, KeyError):
+            return
+
+        out = TextIOWrapper(self.wfile, encoding='utf-8')
+
+        try:
+            with redirect_stdout(out), redirect_stderr(out):
+                status = self.server.run(argv, search_terms)
+
+            out.flush()
+            self.wfile.write(STATUS_SEPARATOR + str(status).encode())
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+        finally:
+            out.detach()
+
+
+# Removes the socket left behind at `socket_path` by a server that didn't exit cleanly. Sockets
+# that a server still listens on are left alone, raising `RuntimeError`.
+def remove_stale_socket(socket_path: str):
+    if not (os.path.exists(socket_path) and stat.S_ISSOCK(os.stat(socket_path).st_mode)):
+        return
+
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as s:
+        try:
+            s.connect(socket_path)
+        except ConnectionRefusedError:
+            os.remove(socket_path)
+            return
+
+    raise RuntimeError(f'A server is already listening on {socket_path}')
+
+
+# The `run` variable holds a function taking the CLI arguments and search terms of a query, which
+# prints its output and returns its exit status. Queries are answered one at a time.
+def serve(socket_path: str, run):
+    remove_stale_socket(socket_path)
+
+    # Exit cleanly (removing the socket) when terminated
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+
+    with socketserver.UnixStreamServer(socket_path, QueryHandler) as server:
+        server.run = run
+        inode = os.stat(socket_path).st_ino
+
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            # The socket is only removed if it is still ours
+            try:
+                if os.stat(socket_path).st_ino == inode:
+                    os.remove(socket_path)
+            except OSError:
+                pass
+
+
+# Interactive alternative to `serve`, reading queries (as CLI arguments) from a prompt
+def prompt(run):
+    while True:
+        try:
+            line = input('shihtzu> ')
+        except (EOFError, KeyboardInterrupt):
+            print()
+            return
+
+        try:
+            argv = shlex.split(line)
+        except ValueError as e:
+            print(f'{type(e).__name__}: {e}', file=sys.stderr)
+            continue
+
+        if argv:
+            run(argv, None)
+
+
+# Sends a query to the server listening on `socket_path`, writes its output to `out` and returns
+# its exit status.
+def send_query(socket_path: str, argv: list[str], search_terms: list[str], out) -> int:
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as s:
+        s.connect(socket_path)
+        s.sendall(json.dumps({'argv': argv, 'search_terms': search_terms}).encode() + b'\n')
+
+        # The status trails the output, so the end of the received data is only written out once
+        # it is known not to hold the separator.
+        pending = b''
+
+        while True:
+            data = s.recv(DEFAULT_BUFFER_SIZE * 16)
+
+            if not data:
+                break
+
+            pending += data
+            separator = pending.rfind(STATUS_SEPARATOR)
+            keep = len(pending) - separator if separator >= 0 else 0
+
+            out.write(pending[:len(pending) - keep])
+            pending = pending[len(pending) - keep:]
+
+    out.flush()
+
+    if not pending.startswith(STATUS_SEPARATOR):
+        raise ConnectionError('Incomplete response from the shihtzu server')
+
+    return int(pending[len(STATUS_SEPARATOR):] or 1)
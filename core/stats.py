@@ -0,0 +1,162 @@
+#!/usr/bin/env python3
+
+from collections import defaultdict
+from contextlib import contextmanager
+from time import perf_counter
+import sys
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+
+# Phases of a query, in the order they are reported. Loading phases (`discovery` to `cache`) are
+# summed over the worker processes when using `--jobs`, so they may add up to more than `total`.
+STATS_PHASES = ('terms', 'discovery', 'read', 'decode', 'build', 'cache', 'match', 'output')
+
+STATS_COUNTERS = (
+    ('files', 'Files'),
+    ('bytes', 'Bytes read'),
+    ('parsed', 'Objects parsed'),
+    ('matched', 'Objects matched')
+)
+
+
+# Text file wrapper timing reads and counting the bytes consumed from the underlying file
+class TimedReader:
+    def __init__(self, fo, stats, phase='read'):
+        self.fo = fo
+        self.stats = stats
+        self.phase = phase
+        self.offset = 0
+
+    def read(self, size=-1) -> str:
+        start = perf_counter()
+        data = self.fo.read(size)
+        self.stats.times[self.phase] += perf_counter() - start
+
+        offset = self.fo.buffer.tell()
+        self.stats.counters['bytes'] += offset - self.offset
+        self.offset = offset
+
+        return data
+
+
+# Text stream wrapper timing writes (i.e. the output of queries)
+class TimedWriter:
+    def __init__(self, fo, stats, phase='output'):
+        self.fo = fo
+        self.stats = stats
+        self.phase = phase
+
+    def write(self, data: str) -> int:
+        start = perf_counter()
+        written = self.fo.write(data)
+        self.stats.times[self.phase] += perf_counter() - start
+
+        return written
+
+    def flush(self):
+        start = perf_counter()
+        self.fo.flush()
+        self.stats.times[self.phase] += perf_counter() - start
+
+    def __getattr__(self, name):
+        return getattr(self.fo, name)
+
+
+# Time spent in each phase of a query and counts of the data it went through, reported by
+# `--stats`. Instances are picklable so that worker processes can send theirs back to be merged.
+class Stats:
+    def __init__(self):
+        self.start = perf_counter()
+        self.times = defaultdict(float)
+        self.counters = defaultdict(int)
+
+    @contextmanager
+    def phase(self, phase: str):
+        start = perf_counter()
+
+        try:
+            yield
+        finally:
+            self.times[phase] += perf_counter() - start
+
+    # Wraps `func` so that the time spent in its calls is added to `phase`
+    def timed(self, phase: str, func):
+        times = self.times
+
+        def wrapper(*args, **kwargs):
+            start = perf_counter()
+
+            try:
+                return func(*args, **kwargs)
+            finally:
+                times[phase] += perf_counter() - start
+
+        return wrapper
+
+    # Yields the items of `iterable`, adding the time spent producing them to `phase`. Time spent in
+    # the phases listed in `exclude` meanwhile (i.e. reading the file being decoded) is not counted
+    # twice.
+    def timed_iter(self, phase: str, iterable, exclude=()):
+        times = self.times
+        it = iter(iterable)
+
+        while True:
+            start = perf_counter()
+            excluded = sum(times[p] for p in exclude)
+
+            try:
+                item = next(it)
+            except StopIteration:
+                times[phase] += perf_counter() - start - (sum(times[p] for p in exclude) - excluded)
+                return
+
+            times[phase] += perf_counter() - start - (sum(times[p] for p in exclude) - excluded)
+
+            yield item
+
+    def merge(self, other):
+        for phase, elapsed in other.times.items():
+            self.times[phase] += elapsed
+
+        for counter, count in other.counters.items():
+            self.counters[counter] += count
+
+    # Peak resident set size (in MB) of the process and of its (terminated) worker processes
+    @staticmethod
+    def peak_memory() -> float:
+        if resource is None:
+            return 0.0
+
+        rss = max(
+            resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+            resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+        )
+
+        # `ru_maxrss` is in bytes on macOS and in kilobytes elsewhere
+        return rss / (1024 * 1024 if sys.platform == 'darwin' else 1024)
+
+    def report(self, fo=sys.stderr):
+        total = perf_counter() - self.start
+
+        lines = ['', 'Statistics:']
+
+        for phase in STATS_PHASES:
+            elapsed = self.times.get(phase, 0.0)
+            share = 100 * elapsed / total if total else 0.0
+
+            lines.append(f'  {phase:<16}{elapsed:>10.3f}s {share:>6.1f}%')
+
+        lines.append(f"  {'total':<16}{total:>10.3f}s")
+        lines.append('')
+
+        for counter, label in STATS_COUNTERS:
+            lines.append(f'  {label:<16}{self.counters.get(counter, 0):>11}')
+
+        if resource is not None:
+            lines.append(f"  {'Peak memory':<16}{self.peak_memory():>8.1f} MB")
+
+        print('\n'.join(lines), file=fo)
@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+
+from collections import Counter
+import heapq
+
+# Local imports
+from core.bloodhound import DomainUser, DomainComputer, DomainGroup
+
+
+# Number of groups listed by the summary, largest first
+SUMMARY_TOP_GROUPS = 10
+
+
+# Aggregates of the users, computers and groups of a collection, computed as the objects are
+# streamed: only counters are kept, along with the `top_groups` largest groups (in a heap of
+# (member count, position, name) tuples), so memory doesn't grow with the size of the collection.
+class CollectionSummary:
+    def __init__(self, top_groups=SUMMARY_TOP_GROUPS):
+        self.top_groups = top_groups
+        self.users = Counter()
+        self.computers = Counter()
+        self.groups = Counter()
+        self.operating_systems = Counter()
+        self.largest_groups = []
+
+    def add_user(self, u: DomainUser):
+        self.users['total'] += 1
+        self.users['enabled' if u.enabled else 'disabled'] += 1
+        self.users['kerberoastable'] += bool(u.spns)
+        self.users['asrep_roastable'] += bool(u.dont_req_preauth)
+        self.users['pwd_never_expires'] += bool(u.pwd_never_expires)
+
+    def add_computer(self, c: DomainComputer):
+        self.computers['total'] += 1
+        self.computers['enabled' if c.enabled else 'disabled'] += 1
+        self.computers['laps' if c.has_laps else 'no_laps'] += 1
+        self.operating_systems[c.operating_system or 'Unknown'] += 1
+
+    def add_group(self, g: DomainGroup):
+        position = self.groups['total']
+        members = len(g.member_object_ids)
+
+        self.groups['total'] += 1
+        self.groups['empty'] += not members
+
+        entry = (members, -position, g.sam_account_name or g.object_id)
+
+        if len(self.largest_groups) < self.top_groups:
+            heapq.heappush(self.largest_groups, entry)
+        elif self.top_groups:
+            heapq.heappushpop(self.largest_groups, entry)
+
+    @classmethod
+    def from_objects(cls, users, computers, groups, top_groups=SUMMARY_TOP_GROUPS):
+        summary = cls(top_groups)
+
+        for u in users:
+            summary.add_user(u)
+
+        for c in computers:
+            summary.add_computer(c)
+
+        for g in groups:
+            summary.add_group(g)
+
+        return summary
+
+    def to_dict(self) -> dict:
+        return {
+            'users': {
+                k: self.users[k] for k in (
+                    'total', 'enabled', 'disabled', 'kerberoastable', 'asrep_roastable',
+                    'pwd_never_expires'
+                )
+            },
+            'computers': {
+                k: self.computers[k] for k in ('total', 'enabled', 'disabled', 'laps', 'no_laps')
+            },
+            'operating_systems': dict(self.operating_systems.most_common()),
+            'groups': {k: self.groups[k] for k in ('total', 'empty')},
+            'largest_groups': [
+                {'name': name, 'members': members}
+                for members, _, name in sorted(self.largest_groups, reverse=True)
+            ]
+        }
+
+    def __str__(self):
+        summary = self.to_dict()
+        users, computers, groups = summary['users'], summary['computers'], summary['groups']
+
+        def ratio(count: int, total: int) -> str:
+            return f'{count:>8} ({100 * count / total:.1f}%)' if total else f'{count:>8}'
+
+        sections = [
+            ('Users', [
+                ('Total', f"{users['total']:>8}"),
+                ('Enabled', ratio(users['enabled'], users['total'])),
+                ('Disabled', ratio(users['disabled'], users['total'])),
+                ('Kerberoastable', ratio(users['kerberoastable'], users['total'])),
+                ('AS-REP roastable', ratio(users['asrep_roastable'], users['total'])),
+                ('Password never expires', ratio(users['pwd_never_expires'], users['total']))
+            ]),
+            ('Computers', [
+                ('Total', f"{computers['total']:>8}"),
+                ('Enabled', ratio(computers['enabled'], computers['total'])),
+                ('Disabled', ratio(computers['disabled'], computers['total'])),
+                ('LAPS', ratio(computers['laps'], computers['total'])),
+                ('No LAPS', ratio(computers['no_laps'], computers['total']))
+            ]),
+            ('Operating systems', [
+                (os_name, ratio(count, computers['total']))
+                for os_name, count in summary['operating_systems'].items()
+            ]),
+            ('Groups', [
+                ('Total', f"{groups['total']:>8}"),
+                ('Empty', ratio(groups['empty'], groups['total']))
+            ]),
+            ('Largest groups', [
+                (g['name'], f"{g['members']:>8}") for g in summary['largest_groups']
+            ])
+        ]
+
+        width = max([len(label) for _, rows in sections for label, _ in rows] + [24])
+
+        return '\n\n'.join(
+            '\n'.join([title] + [f'  {label:<{width}}{value}' for label, value in rows])
+            for title, rows in sections if rows
+        )
@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+
+from array import array
+from itertools import compress
+from operator import attrgetter
+import time
+
+# Local imports
+from core.predicate import PREDICATE_UNITS
+
+# NumPy is optional: columns are plain arrays and are scanned using builtins without it
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+
+# Attributes of users and computers holding the timestamps of each Bloodhound property
+TIMESTAMP_ATTRIBUTES = {
+    'whencreated': 'creation_timestamp',
+    'lastlogon': 'last_logon_timestamp',
+    'pwdlastset': 'pwd_last_set_timestamp'
+}
+
+# Upper bounds of the buckets of age histograms (the last bucket has none)
+HISTOGRAM_BUCKETS = ('30d', '90d', '180d', '1y', '2y', '5y')
+
+
+# Number of seconds of a duration such as `90d` (see `PREDICATE_UNITS`)
+def parse_duration(duration: str) -> int:
+    duration = duration.strip().lower()
+
+    try:
+        if duration[-1:] in PREDICATE_UNITS:
+            return int(float(duration[:-1]) * PREDICATE_UNITS[duration[-1]])
+
+        return int(float(duration))
+    except ValueError:
+        raise ValueError(f'Invalid duration: {duration}') from None
+
+
+# Timestamps of users or computers, stored in one column per property so that objects are filtered
+# or counted by age in a single pass over an array, with NumPy if available. Columns are built on
+# first use. Timestamps that were never set (stored as 0 or -1 by Bloodhound) are infinitely old,
+# as with `--where`.
+class TimestampColumns:
+    def __init__(self, objects):
+        self.objects = list(objects)
+        self.columns = {}
+        self.enabled = None
+
+    def column(self, prop: str):
+        if prop not in self.columns:
+            values = map(attrgetter(TIMESTAMP_ATTRIBUTES[prop]), self.objects)
+
+            if numpy is not None:
+                self.columns[prop] = numpy.fromiter(values, dtype=numpy.int64,
+                                                    count=len(self.objects))
+            else:
+                self.columns[prop] = array('q', values)
+
+        return self.columns[prop]
+
+    def enabled_column(self):
+        if self.enabled is None:
+            values = (ado.enabled for ado in self.objects)
+
+            if numpy is not None:
+                self.enabled = numpy.fromiter(values, dtype=bool, count=len(self.objects))
+            else:
+                self.enabled = bytes(map(bool, values))
+
+        return self.enabled
+
+    # Returns the objects whose `prop` timestamp is older than `age` seconds (and that are enabled,
+    # if `enabled` is set) in their original order
+    def older_than(self, prop: str, age: int, enabled=False, now: float = None) -> list:
+        cutoff = (time.time() if now is None else now) - age
+        column = self.column(prop)
+
+        if numpy is not None:
+            mask = column < cutoff
+
+            if enabled:
+                mask &= self.enabled_column()
+
+            return [self.objects[i] for i in numpy.flatnonzero(mask)]
+
+        if enabled:
+            return [
+                ado for ado, t, e in zip(self.objects, column, self.enabled_column())
+                if e and t < cutoff
+            ]
+
+        return [ado for ado, t in zip(self.objects, column) if t < cutoff]
+
+    # Counts the objects by age of their `prop` timestamp. Returns the count of each of `buckets`
+    # (the upper bounds of the buckets in seconds, in increasing order), followed by the count of
+    # the objects older than the last bound and by the count of those whose timestamp was never
+    # set.
+    def histogram(self, prop: str, buckets: list[int], enabled=False, now: float = None) -> list:
+        now = time.time() if now is None else now
+        column = self.column(prop)
+
+        if numpy is not None:
+            if enabled:
+                column = column[self.enabled_column()]
+
+            unset = int(numpy.count_nonzero(column <= 0))
+            ages = now - column[column > 0]
+            counts = numpy.bincount(
+                numpy.searchsorted(numpy.array(buckets), ages, side='right'),
+                minlength=len(buckets) + 1
+            )
+
+            return [int(c) for c in counts] + [unset]
+
+        if enabled:
+            column = list(compress(column, self.enabled_column()))
+
+        # One pass over the column per bound, counting the objects younger than it
+        timestamps = [t for t in column if t > 0]
+        younger = [sum(map(int(now - b).__lt__, timestamps)) for b in buckets]
+        counts = [y - x for x, y in zip([0] + younger, younger + [len(timestamps)])]
+
+        return counts + [len(column) - len(timestamps)]
@@ -1,10 +1,29 @@
 #!/usr/bin/env python3
 
+from contextlib import redirect_stderr
+from functools import partial
+from itertools import chain
 import argparse
+import cProfile
+import io
+import json
+import os
+import shlex
 import sys
 
 # Local imports
 from core.bloodhound import *
+from core.collection import *
+from core.diff import *
+from core.graph import *
+from core.index import *
+from core.match import *
+from core.output import *
+from core.predicate import *
+from core.server import *
+from core.stats import *
+from core.summary import *
+from core.timeline import *
 
 
 HELP_EPILOG = '''\
@@ -20,16 +39,72 @@ Queries:
   list-computer-memberships, lcm  list group memberships of computers
   list-kerberoastable, lk         list domain users with SPNs set
   list-asrep-roastable, la        list domain users that don't require Kerberos pre-authentication
+  list-user-sessions, lus         list computers on which users have sessions
+  list-admin-to, lat              list computers of which users are local admins (through nested
+                                  groups if `-r` is given)
+  list-rdp-to, lrt                list computers to which users can connect using RDP (through
+                                  nested groups if `-r` is given)
+  list-outbound-control, loc      list the rights that objects have over users, computers and
+                                  groups through ACEs (through nested groups if `-r` is given)
+  list-inbound-control, lic       list the principals that have rights over objects through ACEs
+  find-paths, fp                  find the shortest paths from objects to the Domain Admins groups
+                                  (or to the objects matching `--to`) through group memberships,
+                                  local admin and RDP rights, sessions and ACEs
+  list-stale-users, lsu           list users whose last logon (or `--timestamp`) is older than
+                                  `--age`
+  list-stale-computers, lsc       list computers whose last logon (or `--timestamp`) is older
+                                  than `--age`
+  histogram-users, hu             count users by age of their creation (or of `--timestamp`)
+  histogram-computers, hc         count computers by age of their creation (or of `--timestamp`)
+  summary                         count enabled, kerberoastable, AS-REP roastable users and those
+                                  whose password never expires, computers with LAPS and by
+                                  operating system, and list the largest groups
+  serve                           keep the collection in memory and answer queries from a prompt,
+                                  or from a Unix socket if `-S` is given
+  batch [FILE]                    run the queries listed in a file (or stdin), one per line,
+                                  parsing the collection only once
+  diff OLD NEW                    list the objects added, removed or changed between two
+                                  collections (folders or archives), and changed group members
+
+Where expressions:
+  Properties are referred to by their Bloodhound names (i.e. samaccountname), and compared with
+  strings, numbers, true, false or null using ==, !=, <, <=, > or >=. The ~ operator checks whether
+  a property (or any string of a list) contains a string. Comparing a timestamp with a duration
+  (i.e. 90d, using s, m, h, d, w or y) compares its age. Comparisons are combined using and, or,
+  not and parentheses, and a property alone is true if it is set to a non-empty value.
 
 Examples:
   > List all Active Directory users:
     shihtzu list-users
+  > List all Active Directory users, reading them from a SharpHound archive:
+    shihtzu -C 20240101123456_BloodHound.zip list-users
   > List the first user whose samaccountname property matches "elliot.alderson":
     shihtzu -n 1 -m samaccountname du elliot.alderson
+  > Describe the users whose samaccountname property is listed in "accounts.txt" (exact matches):
+    shihtzu --exact -m samaccountname -f accounts.txt du
+  > List enabled users whose password never expires and who haven't logged on in 90 days:
+    shihtzu -w 'enabled and pwdneverexpires and lastlogon > 90d' list-users
+  > Summarize the enabled objects of a collection:
+    shihtzu -e summary
+  > List enabled computers whose password hasn't changed in 180 days:
+    shihtzu -e --timestamp pwdlastset --age 180d list-stale-computers
   > Dump the full Bloodhound JSON for enabled users that are members of the group "Domain Admins":
     shihtzu -ej list-group-members "Domain Admins"
+  > List users and computers that are members of "Domain Admins" through nested groups:
+    shihtzu -r list-group-members "Domain Admins"
   > Describe the groups of which users matching "alderson" are members:
     shihtzu list-user-memberships alderson | shihtzu -f - describe-groups
+  > Same as above, parsing the collection only once:
+    shihtzu -S /tmp/shihtzu.sock serve &
+    shihtzu -S /tmp/shihtzu.sock lum alderson | shihtzu -S /tmp/shihtzu.sock -f - dg
+  > Run several queries, parsing the collection only once:
+    printf '%s\\n' lk la 'lgm "Domain Admins"' 'lgm "Enterprise Admins"' | shihtzu batch
+  > Find how users listed in "owned.txt" can become members of "Domain Admins":
+    shihtzu --exact -m samaccountname -f owned.txt find-paths
+  > List the groups of which a user is a member across the domains of a forest:
+    shihtzu -C corp.zip -C emea.corp.zip -r list-user-memberships elliot.alderson
+  > List what changed between two collections of the same domain:
+    shihtzu diff 20240101_BloodHound.zip 20240108_BloodHound.zip
 '''
 
 AVAILABLE_QUERIES = (
@@ -43,11 +118,100 @@ AVAILABLE_QUERIES = (
     'list-user-memberships', 'lum',
     'list-computer-memberships', 'lcm',
     'list-kerberoastable', 'lk',
-    'list-asrep-roastable' 'la'
+    'list-asrep-roastable', 'la',
+    'list-user-sessions', 'lus',
+    'list-admin-to', 'lat',
+    'list-rdp-to', 'lrt',
+    'list-outbound-control', 'loc',
+    'list-inbound-control', 'lic',
+    'find-paths', 'fp',
+    'list-stale-users', 'lsu',
+    'list-stale-computers', 'lsc',
+    'histogram-users', 'hu',
+    'histogram-computers', 'hc',
+    'summary',
+    'serve',
+    'batch',
+    'diff'
 )
 
-
-def parse_args():
+# Queries that can't be answered by the server or run in batches
+STANDALONE_QUERIES = ('serve', 'batch', 'diff')
+
+# Classes of the objects loaded by each query, which `batch` loads upfront
+QUERY_CLASSES = {
+    'list-users': (DomainUser,),
+    'list-computers': (DomainComputer,),
+    'list-groups': (DomainGroup,),
+    'describe-users': (DomainUser,),
+    'describe-computers': (DomainComputer,),
+    'describe-groups': (DomainGroup,),
+    'list-group-members': (DomainGroup, DomainUser, DomainComputer),
+    'list-user-memberships': (DomainUser, DomainGroup),
+    'list-computer-memberships': (DomainComputer, DomainGroup),
+    'list-kerberoastable': (DomainUser,),
+    'list-asrep-roastable': (DomainUser,),
+    'list-user-sessions': (DomainUser, DomainComputer),
+    'list-admin-to': (DomainUser, DomainGroup, DomainComputer),
+    'list-rdp-to': (DomainUser, DomainGroup, DomainComputer),
+    'list-outbound-control': (DomainUser, DomainComputer, DomainGroup),
+    'list-inbound-control': (DomainUser, DomainComputer, DomainGroup),
+    'find-paths': (DomainUser, DomainComputer, DomainGroup),
+    'list-stale-users': (DomainUser,),
+    'list-stale-computers': (DomainComputer,),
+    'histogram-users': (DomainUser,),
+    'histogram-computers': (DomainComputer,),
+    'summary': (DomainUser, DomainComputer, DomainGroup)
+}
+
+# Top-level keys decoded by queries besides the `FIELDS` of their classes (see `AccessIndex` and
+# `ControlIndex`)
+QUERY_FIELDS = {
+    'list-user-sessions': {DomainComputer: DomainComputer.ACCESS_FIELDS},
+    'list-admin-to': {DomainComputer: DomainComputer.ACCESS_FIELDS},
+    'list-rdp-to': {DomainComputer: DomainComputer.ACCESS_FIELDS},
+    'list-outbound-control': {
+        DomainUser: DomainUser.ACE_FIELDS,
+        DomainComputer: DomainComputer.ACE_FIELDS,
+        DomainGroup: DomainGroup.ACE_FIELDS
+    },
+    'list-inbound-control': {
+        DomainUser: DomainUser.ACE_FIELDS,
+        DomainComputer: DomainComputer.ACE_FIELDS,
+        DomainGroup: DomainGroup.ACE_FIELDS
+    },
+    'find-paths': {
+        DomainUser: DomainUser.ACE_FIELDS,
+        DomainComputer: DomainComputer.ACCESS_FIELDS + ['Aces'],
+        DomainGroup: DomainGroup.ACE_FIELDS
+    }
+}
+
+# Relation of the `AccessIndex` used by each access query
+ACCESS_QUERIES = {
+    'list-user-sessions': 'sessions', 'lus': 'sessions',
+    'list-admin-to': 'local_admins', 'lat': 'local_admins',
+    'list-rdp-to': 'remote_desktop_users', 'lrt': 'remote_desktop_users'
+}
+
+# Direction of the ACL edges listed by each control query
+CONTROL_QUERIES = {
+    'list-outbound-control': 'outbound', 'loc': 'outbound',
+    'list-inbound-control': 'inbound', 'lic': 'inbound'
+}
+
+# Class of the objects of each timeline query, and whether it lists stale objects or counts them
+TIMELINE_QUERIES = {
+    'list-stale-users': (DomainUser, 'stale'), 'lsu': (DomainUser, 'stale'),
+    'list-stale-computers': (DomainComputer, 'stale'), 'lsc': (DomainComputer, 'stale'),
+    'histogram-users': (DomainUser, 'histogram'), 'hu': (DomainUser, 'histogram'),
+    'histogram-computers': (DomainComputer, 'histogram'), 'hc': (DomainComputer, 'histogram')
+}
+
+
+# The `resident` variable is set when parsing the arguments of a query run against the resident
+# collection of `serve` or `batch`, which sets the collection and how it is loaded.
+def parse_args(argv=None, check_input_file=True, resident=False):
     parser = argparse.ArgumentParser(
         prog='shihtzu',
         description='A small CLI parser for Bloodhound-generated files.',
@@ -69,6 +233,57 @@ def parse_args():
         help="Output objects in Bloodhound-compatible JSON."
     )
 
+    output_format = parser.add_mutually_exclusive_group()
+
+    output_format.add_argument(
+        '--jsonl',
+        action='store_const',
+        dest='output_format',
+        const='jsonl',
+        default='text',
+        help="Output objects in Bloodhound-compatible JSON, one per line (implies `-j`)."
+    )
+
+    output_format.add_argument(
+        '--json-array',
+        action='store_const',
+        dest='output_format',
+        const='json-array',
+        help="Output objects as a Bloodhound-compatible JSON array (implies `-j`)."
+    )
+
+    parser.add_argument(
+        '-r', '--recursive',
+        action='store_true',
+        help="Resolve nested group memberships in membership queries."
+    )
+
+    parser.add_argument(
+        '-w', '--where',
+        metavar='EXPRESSION',
+        help='Only match objects whose properties satisfy an expression (see below).'
+    )
+
+    parser.add_argument(
+        '-t', '--to',
+        metavar='TERMS',
+        help='Find paths to the objects matching comma-separated search terms (`find-paths`).'
+    )
+
+    parser.add_argument(
+        '--age',
+        metavar='DURATION',
+        default='90d',
+        help='Minimum age of the timestamps of stale objects (default: 90d).'
+    )
+
+    parser.add_argument(
+        '--timestamp',
+        choices=tuple(TIMESTAMP_ATTRIBUTES),
+        help='Timestamp used by stale object queries and histograms (default: lastlogon and '
+             'whencreated).'
+    )
+
     parser.add_argument(
         '-n', '--max-matches',
         type=int,
@@ -76,6 +291,27 @@ def parse_args():
         help="Stop after a specified number of matches (default: 0)."
     )
 
+    match_mode = parser.add_mutually_exclusive_group()
+
+    match_mode.add_argument(
+        '--exact',
+        action='store_true',
+        help="Match objects having a property equal to a search term."
+    )
+
+    match_mode.add_argument(
+        '--prefix',
+        action='store_true',
+        help="Match objects having a property starting with a search term."
+    )
+
+    parser.add_argument(
+        '--jobs',
+        metavar='N',
+        type=int,
+        help="Parse split Bloodhound files using N processes (default: 1, or one per collection)."
+    )
+
     parser.add_argument(
         '-f', '--input-file',
         help='Read search terms from a file (use "-" for stdin).'
@@ -87,6 +323,39 @@ def parse_args():
         help='Match objects using only specific properties (example: samaccountname,description).'
     )
 
+    parser.add_argument(
+        '-C', '--collection',
+        metavar='PATH',
+        action='append',
+        help='Read the Bloodhound files from a folder or a SharpHound archive, which can be '
+             'repeated to merge the collections of several domains (default: ".").'
+    )
+
+    parser.add_argument(
+        '--no-cache',
+        action='store_true',
+        help='Do not read or write the parsed objects cache (stored in "~/.cache/shihtzu").'
+    )
+
+    parser.add_argument(
+        '--stats',
+        action='store_true',
+        help='Print the time spent in each phase of the query, along with memory usage, to stderr.'
+    )
+
+    parser.add_argument(
+        '--profile',
+        metavar='FILE',
+        help='Save a cProfile dump of the query to a file (see the `pstats` module).'
+    )
+
+    parser.add_argument(
+        '-S', '--server',
+        metavar='SOCKET',
+        default=os.environ.get('SHIHTZU_SERVER'),
+        help='Query (or, with `serve`, listen on) a Unix socket (default: $SHIHTZU_SERVER).'
+    )
+
     parser.add_argument(
         'query',
         metavar='query',
@@ -100,7 +369,7 @@ def parse_args():
         help='The search terms for the query.'
     )
 
-    args = parser.parse_args()
+    args = parser.parse_args(argv)
 
     if args.query not in AVAILABLE_QUERIES:
         parser.error(f'Invalid query: {args.query}')
@@ -108,13 +377,39 @@ def parse_args():
     if args.search_terms and args.input_file:
         parser.error('Search terms must be given either via an input file or CLI arguments')
 
-    if args.input_file and args.input_file != '-':
+    if check_input_file and args.input_file and args.input_file != '-':
         if not (os.path.isfile(args.input_file) and os.access(args.input_file, os.R_OK)):
             parser.error(f'Cannot read search terms from file: {args.input_file}')
 
+    if args.output_format != 'text':
+        args.json = True
+
+    if args.where:
+        try:
+            args.where = Predicate(args.where)
+        except ValueError as e:
+            parser.error(str(e))
+
+    try:
+        args.age = parse_duration(args.age)
+    except ValueError as e:
+        parser.error(str(e))
+
     if args.max_matches < 0:
         parser.error(f'Invalid value for `-m`: {args.max_matches}')
 
+    if resident and (args.collection or args.jobs is not None or args.no_cache):
+        parser.error('`-C`, `--jobs` and `--no-cache` must be given to `serve` or `batch`')
+
+    args.collection = args.collection or ['.']
+
+    # Collections are parsed concurrently unless told otherwise
+    if args.jobs is None:
+        args.jobs = min(len(args.collection), os.cpu_count() or 1)
+
+    if args.jobs < 1:
+        parser.error(f'Invalid value for `--jobs`: {args.jobs}')
+
     if args.match_properties:
         match_properties = [mp.strip() for mp in args.match_properties.split(',')]
 
@@ -130,240 +425,705 @@ def parse_args():
     return args
 
 
-def find_ad_objects(ad_objects, search_terms: list[str], enabled=False, max_matches=0):
+def find_ad_objects(ad_objects, search_terms: list[str], enabled=False, max_matches=0,
+                    mode='substring'):
+    accept = ObjectFilter(search_terms, enabled=enabled, mode=mode)
     matches = 0
+    stats = get_stats()
 
-    if not search_terms:
-        for ado in ad_objects:
-            if enabled and not ado.enabled:
-                continue
+    if stats is not None:
+        accept = stats.timed('match', accept)
 
-            yield ado
+    for ado in ad_objects:
+        if not accept(ado):
+            continue
 
-            if max_matches:
-                matches += 1
+        if stats is not None:
+            stats.counters['matched'] += 1
 
-                if matches >= max_matches:
-                    return
-    else:
-        for ado in ad_objects:
-            if enabled and not ado.enabled:
-                continue
+        yield ado
 
-            for st in search_terms:
-                if st not in ado.search_string:
-                    continue
+        if max_matches:
+            matches += 1
 
-                yield ado
+            if matches >= max_matches:
+                return
 
-                if max_matches:
-                    matches += 1
 
-                    if matches >= max_matches:
-                        return
+# Objects among `ad_objects` satisfying `where` (a `Predicate`), for queries over objects of every
+# class built from indexes that don't keep the properties predicates test
+def filter_where(bh: Collection, ad_objects, where, **options):
+    if where is None:
+        return ad_objects
 
+    object_ids = {
+        ado.object_id for cls in (DomainUser, DomainComputer, DomainGroup)
+        for ado in bh.load(cls, where=where, **options)
+    }
 
-def main():
-    args = parse_args()
+    return [ado for ado in ad_objects if ado.object_id in object_ids]
 
+
+def read_search_terms(args) -> list[str]:
+    if args.input_file == '-':
+        return [l.strip('\n').lower() for l in sys.stdin.readlines() if l.strip('\n')]
+
+    if args.input_file:
+        with open(args.input_file, 'rt') as fo:
+            return [l.strip('\n').lower() for l in fo.readlines() if l.strip('\n')]
+
+    return [st.lower() for st in args.search_terms if st]
+
+
+# The `bh` variable holds the `Collection` the objects are loaded from, and the `out` variable the
+# `ResultWriter` results are written to.
+def run_query(args, search_terms: list[str], bh: Collection, out: ResultWriter):
     match_properties = []
 
     if args.match_properties:
         match_properties = [mp.strip() for mp in args.match_properties.split(',') if mp]
 
-    search_terms = [st.lower() for st in args.search_terms if st]
+    cache = not args.no_cache
 
-    if args.input_file == '-':
-        search_terms = [l.strip('\n').lower() for l in sys.stdin.readlines() if l.strip('\n')]
-    elif args.input_file:
-        with open(args.input_file, 'rt') as fo:
-            search_terms = [l.strip('\n').lower() for l in fo.readlines() if l.strip('\n')]
+    # Objects only keep their Bloodhound JSON when it is going to be printed
+    load_options = {'cache': cache, 'raw_json': args.json, 'jobs': args.jobs}
+
+    mode = 'exact' if args.exact else 'prefix' if args.prefix else 'substring'
+
+    # When loading files in parallel, objects are filtered by the worker processes so that only
+    # matches are sent back (`find_ad_objects` still applies `-n`). Exact and prefix matches can
+    # also be looked up in the indexes of resident collections.
+    principal_options = dict(load_options)
+    group_options = dict(load_options)
+
+    if args.jobs > 1 or mode != 'substring':
+        principal_options['accept'] = ObjectFilter(search_terms, enabled=args.enabled, mode=mode)
+        group_options['accept'] = ObjectFilter(search_terms, mode=mode)
+
+    # `--where` applies to the same objects as `-e`, and to groups in group queries
+    if args.where:
+        principal_options['where'] = group_options['where'] = args.where
 
     if args.query in ('list-users', 'lu'):
         dus = None
 
         if match_properties:
-            dus = DomainUser.load_files(search_properties=match_properties)
+            dus = bh.users(search_properties=match_properties, **principal_options)
 
-        for u in find_ad_objects(dus or DomainUser.load_files(), search_terms, enabled=args.enabled,
-                                 max_matches=args.max_matches):
+        for u in find_ad_objects(dus or bh.users(**principal_options), search_terms,
+                                 enabled=args.enabled, max_matches=args.max_matches, mode=mode):
             if args.enabled and not u.enabled:
                 continue
 
-            print(
+            out.write(
                 u.json if args.json else u.sam_account_name if u.sam_account_name else u.object_id
             )
 
-        sys.exit(0)
+        return
 
     if args.query in ('list-computers', 'lc'):
         dcs = None
 
         if match_properties:
-            dcs = DomainComputer.load_files(search_properties=match_properties)
+            dcs = bh.computers(search_properties=match_properties, **principal_options)
 
-        for c in find_ad_objects(dcs or DomainComputer.load_files(), search_terms,
-                                 enabled=args.enabled, max_matches=args.max_matches):
+        for c in find_ad_objects(dcs or bh.computers(**principal_options),
+                                 search_terms, enabled=args.enabled,
+                                 max_matches=args.max_matches, mode=mode):
             if args.enabled and not c.enabled:
                 continue
 
-            print(
+            out.write(
                 c.json if args.json else c.sam_account_name if c.sam_account_name else c.object_id
             )
 
-        sys.exit(0)
+        return
 
     if args.query in ('list-groups', 'lg'):
         dgs = None
 
         if match_properties:
-            dgs = DomainGroup.load_files(search_properties=match_properties)
+            dgs = bh.groups(search_properties=match_properties, **group_options)
 
-        for g in find_ad_objects(dgs or DomainGroup.load_files(), search_terms,
-                                 max_matches=args.max_matches):
-            print(
+        for g in find_ad_objects(dgs or bh.groups(**group_options), search_terms,
+                                 max_matches=args.max_matches, mode=mode):
+            out.write(
                 g.json if args.json else g.sam_account_name if g.sam_account_name else g.object_id
             )
 
-        sys.exit(0)
+        return
 
     if args.query in ('describe-users', 'du'):
         dus = None
 
         if match_properties:
-            dus = DomainUser.load_files(search_properties=match_properties)
+            dus = bh.users(search_properties=match_properties, **principal_options)
 
-        for u in find_ad_objects(dus or DomainUser.load_files(), search_terms,
-                                 enabled=args.enabled, max_matches=args.max_matches):
-            print(u.json if args.json else f'\n{u}')
+        for u in find_ad_objects(dus or bh.users(**principal_options), search_terms,
+                                 enabled=args.enabled, max_matches=args.max_matches, mode=mode):
+            out.write(u.json if args.json else f'\n{u}')
 
-        sys.exit(0)
+        return
 
     if args.query in ('describe-computers', 'dc'):
         dcs = None
 
         if match_properties:
-            dcs = DomainComputer.load_files(search_properties=match_properties)
+            dcs = bh.computers(search_properties=match_properties, **principal_options)
 
-        for c in find_ad_objects(dcs or DomainComputer.load_files(), search_terms,
-                                 enabled=args.enabled, max_matches=args.max_matches):
-            print(c.json if args.json else f'\n{c}')
+        for c in find_ad_objects(dcs or bh.computers(**principal_options),
+                                 search_terms, enabled=args.enabled,
+                                 max_matches=args.max_matches, mode=mode):
+            out.write(c.json if args.json else f'\n{c}')
 
-        sys.exit(0)
+        return
 
     if args.query in ('describe-groups', 'dg'):
         dgs = None
 
         if match_properties:
-            dgs = DomainGroup.load_files(search_properties=match_properties)
+            dgs = bh.groups(search_properties=match_properties, **group_options)
 
-        for g in find_ad_objects(dgs or DomainGroup.load_files(), search_terms,
-                                 max_matches=args.max_matches):
-            print(g.json if args.json else f'\n{g}')
+        for g in find_ad_objects(dgs or bh.groups(**group_options), search_terms,
+                                 max_matches=args.max_matches, mode=mode):
+            out.write(g.json if args.json else f'\n{g}')
 
-        sys.exit(0)
+        return
 
     if args.query in ('list-group-members', 'lgm'):
         dgs = None
+        group_options['raw_json'] = False
+        group_options.pop('where', None)
 
-        if match_properties:
-            dgs = DomainGroup.load_files(search_properties=match_properties)
-
-        for g in find_ad_objects(DomainGroup.load_files(), search_terms,
-                                 max_matches=args.max_matches):
-            for u in DomainUser.load_files():
-                if args.enabled and not u.enabled:
-                    continue
-
-                if g.contains(u.object_id):
-                    print(
-                        u.json if args.json else \
-                        u.sam_account_name if u.sam_account_name else u.object_id
-                    )
-
-            for c in DomainComputer.load_files():
-                if args.enabled and not c.enabled:
-                    continue
-
-                if g.contains(c.object_id):
-                    print(
-                        c.json if args.json else \
-                        c.sam_account_name if c.sam_account_name else c.object_id
-                    )
+        if args.recursive:
+            # Nested memberships require the whole group graph
+            group_options.pop('accept', None)
 
-        sys.exit(0)
+            if match_properties:
+                group_options['search_properties'] = match_properties
+
+            index = bh.membership_index(**group_options)
+            dgs = index.groups.values()
+        elif match_properties:
+            dgs = bh.groups(search_properties=match_properties, **group_options)
+
+        groups = list(find_ad_objects(dgs or bh.groups(**group_options), search_terms,
+                                      max_matches=args.max_matches, mode=mode))
+
+        if not groups:
+            return
+
+        members = {
+            g.object_id: index.members_of(g.object_id, recursive=True) if args.recursive else \
+            g.member_object_ids for g in groups
+        }
+
+        # Load users and computers only once, keeping those that are members of any matched group
+        member_ids = set().union(*members.values())
+        member_filter = ObjectFilter(enabled=args.enabled, object_ids=member_ids)
+
+        member_options = dict(load_options, accept=member_filter)
+
+        if args.where:
+            member_options['where'] = args.where
+
+        # Members are looked up by object ID, and listed in the order of the files (users first)
+        loaded = {}
+
+        for ado in chain(bh.users(**member_options), bh.computers(**member_options)):
+            loaded.setdefault(ado.object_id, (len(loaded), ado))
+
+        for g in groups:
+            found = sorted(loaded[m] for m in members[g.object_id] if m in loaded)
+
+            for _, ado in found:
+                out.write(
+                    ado.json if args.json else \
+                    ado.sam_account_name if ado.sam_account_name else ado.object_id
+                )
+
+        return
 
     if args.query in ('list-user-memberships', 'lum'):
         dus = None
+        principal_options['raw_json'] = False
 
         if match_properties:
-            dus = DomainUser.load_files(search_properties=match_properties)
+            dus = bh.users(search_properties=match_properties, **principal_options)
 
-        for u in find_ad_objects(dus or DomainUser.load_files(), search_terms,
-                                 enabled=args.enabled, max_matches=args.max_matches):
-            for g in DomainGroup.load_files():
-                if g.contains(u.object_id):
-                    print(
-                        g.json if args.json else \
-                        g.sam_account_name if g.sam_account_name else g.object_id
-                    )
+        index = bh.membership_index(**load_options)
 
-        sys.exit(0)
+        for u in find_ad_objects(dus or bh.users(**principal_options), search_terms,
+                                 enabled=args.enabled, max_matches=args.max_matches, mode=mode):
+            for g in index.groups_of(u.object_id, recursive=args.recursive):
+                out.write(
+                    g.json if args.json else \
+                    g.sam_account_name if g.sam_account_name else g.object_id
+                )
+
+        return
 
     if args.query in ('list-computer-memberships', 'lcm'):
         dcs = None
+        principal_options['raw_json'] = False
 
         if match_properties:
-            dcs = DomainComputer.load_files(search_properties=match_properties)
+            dcs = bh.computers(search_properties=match_properties, **principal_options)
 
-        for c in find_ad_objects(dcs or DomainComputer.load_files(), search_terms,
-                                 enabled=args.enabled, max_matches=args.max_matches):
-            for g in DomainGroup.load_files():
-                if g.contains(c.object_id):
-                    print(
-                        g.json if args.json else \
-                        g.sam_account_name if g.sam_account_name else g.object_id
-                    )
+        index = bh.membership_index(**load_options)
 
-        sys.exit(0)
+        for c in find_ad_objects(dcs or bh.computers(**principal_options),
+                                 search_terms, enabled=args.enabled,
+                                 max_matches=args.max_matches, mode=mode):
+            for g in index.groups_of(c.object_id, recursive=args.recursive):
+                out.write(
+                    g.json if args.json else \
+                    g.sam_account_name if g.sam_account_name else g.object_id
+                )
+
+        return
 
     if args.query in ('list-kerberoastable', 'lk'):
         dus = None
 
         if match_properties:
-            dus = DomainUser.load_files(search_properties=match_properties)
+            dus = bh.users(search_properties=match_properties, **principal_options)
 
-        for u in find_ad_objects(DomainUser.load_files(), search_terms, enabled=args.enabled,
-                                 max_matches=args.max_matches):
+        for u in find_ad_objects(dus or bh.users(**principal_options), search_terms,
+                                 enabled=args.enabled, max_matches=args.max_matches, mode=mode):
             if not u.spns:
                 continue
 
-            print(
+            out.write(
                 u.json if args.json else u.sam_account_name if u.sam_account_name else u.object_id
             )
 
-        sys.exit(0)
+        return
 
     if args.query in ('list-asrep-roastable', 'la'):
         dus = None
 
         if match_properties:
-            dus = DomainUser.load_files(search_properties=match_properties)
+            dus = bh.users(search_properties=match_properties, **principal_options)
 
-        for u in find_ad_objects(dus or DomainUser.load_files(), search_terms,
-                                 enabled=args.enabled, max_matches=args.max_matches):
+        for u in find_ad_objects(dus or bh.users(**principal_options), search_terms,
+                                 enabled=args.enabled, max_matches=args.max_matches, mode=mode):
             if not u.dont_req_preauth:
                 continue
 
-            print(
+            out.write(
                 u.json if args.json else u.sam_account_name if u.sam_account_name else u.object_id
             )
 
+        return
+
+    if args.query in ACCESS_QUERIES:
+        dus = None
+        relation = ACCESS_QUERIES[args.query]
+        principal_options['raw_json'] = False
+
+        if match_properties:
+            dus = bh.users(search_properties=match_properties, **principal_options)
+
+        access = bh.access_index(**load_options)
+
+        # Local admin and RDP rights are often granted to groups rather than to users
+        if args.recursive and relation != 'sessions':
+            index = bh.membership_index(cache=cache, jobs=args.jobs)
+
+        for u in find_ad_objects(dus or bh.users(**principal_options), search_terms,
+                                 enabled=args.enabled, max_matches=args.max_matches, mode=mode):
+            object_ids = [u.object_id]
+
+            if args.recursive and relation != 'sessions':
+                object_ids.extend(g.object_id for g in index.groups_of(u.object_id, recursive=True))
+
+            for c in access.computers_of(object_ids, relation):
+                out.write(
+                    c.json if args.json else \
+                    c.sam_account_name if c.sam_account_name else c.object_id
+                )
+
+        return
+
+    if args.query in CONTROL_QUERIES:
+        control_options = {'cache': cache, 'jobs': args.jobs}
+
+        if match_properties:
+            control_options['search_properties'] = match_properties
+
+        control = bh.control_index(**control_options)
+
+        def name(object_id: str) -> str:
+            ado = control.get(object_id)
+
+            return ado.sam_account_name if ado and ado.sam_account_name else object_id
+
+        def write_edge(principal_id: str, right: str, target_id: str):
+            if args.json:
+                out.write(json.dumps({
+                    'principal': name(principal_id), 'principal_id': principal_id,
+                    'right': right, 'target': name(target_id), 'target_id': target_id
+                }))
+            else:
+                out.write(f'{name(principal_id)}\t{right}\t{name(target_id)}')
+
+        # Rights are often granted to groups rather than to their members
+        if args.recursive and CONTROL_QUERIES[args.query] == 'outbound':
+            index = bh.membership_index(cache=cache, jobs=args.jobs)
+
+        # `--where` applies to the principals (or targets) being matched
+        objects = filter_where(bh, control.objects, args.where, cache=cache, jobs=args.jobs)
+
+        for ado in find_ad_objects(objects, search_terms, enabled=args.enabled,
+                                   max_matches=args.max_matches, mode=mode):
+            if CONTROL_QUERIES[args.query] == 'inbound':
+                for principal_id, right in control.controllers_of(ado.object_id):
+                    write_edge(principal_id, right, ado.object_id)
+
+                continue
+
+            object_ids = [ado.object_id]
+
+            if args.recursive:
+                object_ids.extend(
+                    g.object_id for g in index.groups_of(ado.object_id, recursive=True)
+                )
+
+            for principal_id, right, target in control.controlled_by(object_ids):
+                write_edge(principal_id, right, target.object_id)
+
+        return
+
+    if args.query in ('find-paths', 'fp'):
+        graph_options = {'cache': cache, 'jobs': args.jobs}
+
+        if match_properties:
+            graph_options['search_properties'] = match_properties
+
+        graph = bh.attack_graph(**graph_options)
+
+        def name(object_id: str) -> str:
+            ado = graph.control.get(object_id)
+
+            return ado.sam_account_name if ado and ado.sam_account_name else object_id
+
+        # `--where` applies to the sources of paths, not to their targets
+        sources = find_ad_objects(
+            filter_where(bh, graph.control.objects, args.where, cache=cache, jobs=args.jobs),
+            search_terms, enabled=args.enabled, max_matches=args.max_matches, mode=mode
+        )
+
+        if args.to:
+            to_terms = [t.strip().lower() for t in args.to.split(',') if t.strip()]
+            targets = [ado.object_id for ado in find_ad_objects(graph.control.objects, to_terms,
+                                                                 mode=mode)]
+        else:
+            targets = graph.domain_admins()
+
+        for object_ids, labels in graph.shortest_paths((s.object_id for s in sources), targets):
+            if args.json:
+                out.write(json.dumps({
+                    'nodes': [{'name': name(o), 'object_id': o} for o in object_ids],
+                    'edges': labels
+                }))
+            else:
+                out.write(''.join(
+                    f'{name(o)} -[{label}]-> ' for o, label in zip(object_ids, labels)
+                ) + name(object_ids[-1]))
+
+        return
+
+    # Objects are streamed through the summary, which only keeps counters
+    if args.query == 'summary':
+        principal_options['raw_json'] = group_options['raw_json'] = False
+
+        summary = CollectionSummary.from_objects(*(
+            find_ad_objects(load(**options), search_terms, enabled=enabled, mode=mode)
+            for load, options, enabled in (
+                (bh.users, principal_options, args.enabled),
+                (bh.computers, principal_options, args.enabled),
+                (bh.groups, group_options, False)
+            )
+        ))
+
+        out.write(json.dumps(summary.to_dict()) if args.json else str(summary))
+
+        return
+
+    if args.query in TIMELINE_QUERIES:
+        cls, kind = TIMELINE_QUERIES[args.query]
+        prop = args.timestamp or ('lastlogon' if kind == 'stale' else 'whencreated')
+        timeline_options = dict(principal_options, raw_json=args.json and kind == 'stale')
+        timeline_options.pop('accept', None)
+
+        if match_properties:
+            timeline_options['search_properties'] = match_properties
+
+        # Objects are matched by search terms first, and filtered by age using their columns
+        if search_terms:
+            timeline_options['accept'] = ObjectFilter(search_terms, mode=mode)
+
+        columns = bh.timestamp_columns(cls, **timeline_options)
+
+        if kind == 'stale':
+            matches = columns.older_than(prop, args.age, enabled=args.enabled)
+
+            for ado in matches[:args.max_matches or None]:
+                out.write(
+                    ado.json if args.json else \
+                    ado.sam_account_name if ado.sam_account_name else ado.object_id
+                )
+
+            return
+
+        buckets = [parse_duration(b) for b in HISTOGRAM_BUCKETS]
+        counts = columns.histogram(prop, buckets, enabled=args.enabled)
+        labels = [f'< {HISTOGRAM_BUCKETS[0]}'] + [
+            f'{a} - {b}' for a, b in zip(HISTOGRAM_BUCKETS, HISTOGRAM_BUCKETS[1:])
+        ] + [f'> {HISTOGRAM_BUCKETS[-1]}', 'never']
+
+        for label, count in zip(labels, counts):
+            out.write(
+                json.dumps({'age': label, 'count': count}) if args.json else \
+                f'{label:<12}{count}'
+            )
+
+        return
+
+
+# Runs `run_query`, writing its results to stdout, printing its statistics to stderr (`--stats`)
+# and saving its profile (`--profile`) if requested. Statistics are collected through the
+# `set_stats` hook.
+def run_instrumented(args, search_terms: list[str], bh: Collection, stats=None):
+    stats = (stats or Stats()) if args.stats else None
+    profiler = cProfile.Profile() if args.profile else None
+    out = ResultWriter(TimedWriter(sys.stdout, stats) if stats else sys.stdout, args.output_format)
+
+    set_stats(stats)
+
+    try:
+        if profiler:
+            profiler.enable()
+
+        try:
+            run_query(args, search_terms, bh, out)
+        finally:
+            out.close()
+    finally:
+        set_stats(None)
+
+        if profiler:
+            profiler.disable()
+            profiler.dump_stats(args.profile)
+
+        if stats:
+            stats.report(sys.stderr)
+
+
+# Runs a query of `serve` or `batch` against their resident collection `bh`, which was loaded
+# according to `resident_args` (their own arguments). Returns the exit status of the query.
+def run_request(bh: Collection, resident_args, argv: list[str],
+                search_terms: list[str] = None) -> int:
+    try:
+        args = parse_args(argv, check_input_file=search_terms is None, resident=True)
+    except SystemExit as e:
+        return e.code
+
+    args.collection = resident_args.collection
+    args.jobs = resident_args.jobs
+    args.no_cache = resident_args.no_cache
+
+    if args.query == 'serve':
+        print('Error: the server is already running')
+        return 1
+
+    if args.query in STANDALONE_QUERIES:
+        print(f'Error: `{args.query}` cannot be run by the server or in batches')
+        return 1
+
+    try:
+        if search_terms is None:
+            search_terms = read_search_terms(args)
+
+        run_instrumented(args, search_terms, bh)
+    except Exception as e:
+        print(f'{type(e).__name__}: {e}')
+        return 1
+
+    return 0
+
+
+# Full name of a query given by its full name or its alias
+def query_name(query: str) -> str:
+    i = AVAILABLE_QUERIES.index(query)
+
+    return query if query in QUERY_CLASSES else AVAILABLE_QUERIES[i - 1]
+
+
+# Runs the queries listed in `path` ("-" for stdin), given as CLI arguments (one query per line,
+# ignoring empty lines and those starting with "#"). The objects of every type needed by the
+# queries are parsed in a single pass upfront (decoding the fields needed by all of them, and
+# keeping their JSON if any query outputs it) into a resident collection, which every query and
+# index is then run against. Queries using `-m` or `--where`
+# build objects of their own, in a single pass shared by the queries using the same options.
+# Results are written in one section per query, labelled with the query. Returns 1 if any query
+# failed, or 0 otherwise.
+def run_batch(args, path: str) -> int:
+    if path == '-':
+        lines = sys.stdin.read().splitlines()
+    else:
+        with open(path, 'rt') as fo:
+            lines = fo.read().splitlines()
+
+    queries = []
+
+    for line in lines:
+        if not line.strip() or line.lstrip().startswith('#'):
+            continue
+
+        try:
+            argv = shlex.split(line)
+        except ValueError as e:
+            print(f'{type(e).__name__}: {e} ({line})', file=sys.stderr)
+            return 1
+
+        queries.append((line.strip(), argv))
+
+    # Plan the loads, decoding the fields needed by every query: errors are reported when running
+    # the queries
+    fields = {}
+    raw_json = False
+
+    for _, argv in queries:
+        try:
+            with redirect_stderr(io.StringIO()):
+                qargs = parse_args(argv, check_input_file=False, resident=True)
+        except SystemExit:
+            continue
+
+        if qargs.query in STANDALONE_QUERIES:
+            continue
+
+        name = query_name(qargs.query)
+        raw_json = raw_json or qargs.json
+
+        for cls in QUERY_CLASSES[name]:
+            cls_fields = fields.setdefault(cls, dict.fromkeys(cls.FIELDS))
+            cls_fields.update(dict.fromkeys(QUERY_FIELDS.get(name, {}).get(cls, ())))
+
+    bh = ResidentCollection(args.collection)
+
+    for cls, cls_fields in fields.items():
+        load_options = {'cache': not args.no_cache, 'raw_json': raw_json, 'jobs': args.jobs}
+
+        for _ in bh.load(cls, fields=list(cls_fields), **load_options):
+            pass
+
+    status = 0
+
+    for i, (line, argv) in enumerate(queries):
+        if i:
+            print()
+
+        print(f'==> {line} <==', flush=True)
+
+        if run_request(bh, args, argv):
+            status = 1
+
+    return status
+
+
+# Compares the two collections given as search terms (see `diff_collections`). Changes are written
+# grouped by object type, or one JSON object per change when using `-j`.
+def run_diff(args):
+    if len(args.search_terms) != 2:
+        raise ValueError('Two collections must be given to `diff`: OLD NEW')
+
+    old_path, new_path = args.search_terms
+    out = ResultWriter(sys.stdout, args.output_format)
+
+    try:
+        for cls, changes in diff_collections(old_path, new_path, jobs=args.jobs):
+            if args.json:
+                for c in changes:
+                    out.write(json.dumps(c.to_dict()))
+
+                continue
+
+            counts = {change: 0 for change in ('added', 'removed', 'changed')}
+
+            for c in changes:
+                counts[c.change] += 1
+
+            kind = cls.__name__.replace('Domain', '').lower()
+            out.write(f"{kind}s: {', '.join(f'{n} {change}' for change, n in counts.items())}")
+
+            for c in changes:
+                out.write(str(c))
+    finally:
+        out.close()
+
+
+def main():
+    args = parse_args()
+
+    if args.query == 'diff':
+        run_diff(args)
+        sys.exit(0)
+
+    if args.query == 'batch':
+        if len(args.search_terms) > 1:
+            raise ValueError('Batches are read from a single file')
+
+        sys.exit(run_batch(args, args.search_terms[0] if args.search_terms else '-'))
+
+    if args.query == 'serve':
+        # Fail before parsing the collection if another server is listening on the socket
+        if args.server:
+            remove_stale_socket(args.server)
+
+        bh = ResidentCollection(args.collection)
+
+        # Parse everything upfront so that the first queries don't have to
+        for load in (bh.users, bh.computers, bh.groups):
+            for _ in load(cache=not args.no_cache, jobs=args.jobs):
+                pass
+
+        bh.membership_index(cache=not args.no_cache)
+
+        run = partial(run_request, bh, args)
+
+        if args.server:
+            print(f'Listening on {args.server}', file=sys.stderr)
+            serve(args.server, run)
+        else:
+            prompt(run)
+
         sys.exit(0)
 
+    stats = Stats() if args.stats and not args.server else None
+
+    if stats:
+        with stats.phase('terms'):
+            search_terms = read_search_terms(args)
+    else:
+        search_terms = read_search_terms(args)
+
+    if args.server:
+        sys.exit(send_query(args.server, sys.argv[1:], search_terms, sys.stdout.buffer))
+
+    run_instrumented(args, search_terms, Collection(args.collection), stats=stats)
+
+
 if __name__ == '__main__':
     try:
         main()
+    except BrokenPipeError:
+        # The reader of the output went away (i.e. `| head`), which isn't an error. Further writes
+        # to stdout (i.e. when flushing it at exit) are sent to /dev/null.
+        os.dup2(os.open(os.devnull, os.O_WRONLY), sys.stdout.fileno())
+        sys.exit(0)
     except Exception as e:
         print(f'{type(e).__name__}: {e}')
         sys.exit(1)